@@ -5,17 +5,34 @@ import tempfile
 import os
 import re
 import base64
+import contextlib
+import contextvars
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from PyPDF2 import PdfReader
 from fpdf import FPDF
 from io import BytesIO
-# Use RapidFuzz, que é mais rápido para fuzzy matching
-from rapidfuzz import process, fuzz
+from xml.sax.saxutils import escape as xml_escape
 
 # Bibliotecas para gerar DOCX
 from docx import Document
-from docx.shared import Pt, Inches, RGBColor
+from docx.shared import Inches
 from docx.enum.section import WD_ORIENT
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+
+from armazem import ArmazemExtracoes
+from diagnostico import (PERFILADORES, coletar_medicoes, medir_etapa, perfilar, registrar_medicoes,
+                         resumir_medicoes)
+from extracao_pdf import (TabelaExtraida, dividir_em_blocos, encontrar_cabecalho, iterar_paginas_texto,
+                          ler_pagina_ocr, ler_paginas_camelot, mapear_paginas_sem_texto)
+from glossario import GlossarioCompilado, ServicoGlossarios
+from tarefas import FALHOU, NA_FILA, FilaTarefas
 
 ###############################################################################
 # FALLBACK PARA st.session_state (EVITA KeyError)
@@ -24,9 +41,12 @@ _fallback_state = {
     "df_completo": None,
     "df_descontos": None,
     "df_descontos_gloss": None,
-    "df_descontos_gloss_sel": None,
+    "resumo_descricoes": None,
+    "selecao_descontos": None,
     "nome_cliente": None,
     "matricula": None,
+    "documentos_carregados": None,
+    "versao_glossario_filtro": None,
     # Inserido para suportar valor B no cálculo de indébito:
     "valor_recebido": ""
 }
@@ -51,8 +71,62 @@ def set_state_value(key, value):
 ###############################################################################
 st.set_page_config(page_title="Analista de Contracheques", layout="centered")
 
+# Copy-on-write: seleções, assign e cópias rasas compartilham os dados até a
+# primeira escrita, dispensando as cópias defensivas (df.copy()) entre etapas
+pd.set_option("mode.copy_on_write", True)
+
 LOGO_PATH = "MP.png"  # Caminho para a logomarca
 GLOSSARY_PATH = "Rubricas.txt"  # Nome do arquivo de Glossário (Rubricas.txt)
+# Glossários adicionais (por banco ou categoria), um *.txt por glossário,
+# selecionáveis no app; os arquivos alterados são recarregados sem reiniciar
+GLOSSARIOS_DIR = os.environ.get("CONTRACHEQUE_GLOSSARIOS_DIR", "glossarios")
+GLOSSARIOS_INTERVALO_S = 2.0  # intervalo mínimo entre verificações do mtime
+
+# Cache de extrações: incrementar PARSER_VERSION sempre que a extração mudar,
+# para invalidar os resultados guardados com a versão anterior.
+PARSER_VERSION = "5"
+CACHE_MAX_DOCUMENTOS = 32
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+CACHE_DIR = os.environ.get("CONTRACHEQUE_CACHE_DIR", "")  # vazio = somente memória
+
+# Armazém SQLite com as extrações de todos os clientes, para reabrir casos e
+# consultar o histórico (vazio = desativado). Ver armazem.py
+ARMAZEM_PATH = os.environ.get("CONTRACHEQUE_ARMAZEM", "contracheques.sqlite3")
+
+# Extração paralela: o documento é dividido em blocos de páginas lidos pelo
+# Camelot em processos separados (EXTRACAO_WORKERS = 1 desativa o paralelismo).
+EXTRACAO_PARALELA = os.environ.get("CONTRACHEQUE_EXTRACAO_PARALELA", "1") == "1"
+EXTRACAO_WORKERS = int(os.environ.get("CONTRACHEQUE_EXTRACAO_WORKERS", min(4, os.cpu_count() or 1)))
+PAGINAS_POR_BLOCO = int(os.environ.get("CONTRACHEQUE_PAGINAS_POR_BLOCO", 4))
+
+# Fila de extrações em segundo plano, compartilhada entre as sessões: número
+# de documentos extraídos ao mesmo tempo (cada um com até EXTRACAO_WORKERS
+# processos) e intervalo com que a sessão consulta o andamento
+EXTRACAO_TAREFAS = int(os.environ.get("CONTRACHEQUE_EXTRACAO_TAREFAS",
+                                      max(1, (os.cpu_count() or 1) // max(1, EXTRACAO_WORKERS))))
+TAREFAS_INTERVALO_S = 0.5
+
+# Motor de extração: "camelot" (grade via Ghostscript/OpenCV) ou "texto"
+# (coordenadas das palavras na camada de texto, com Camelot só nas páginas
+# em que o layout SEAD não é reconhecido).
+MOTOR_EXTRACAO = os.environ.get("CONTRACHEQUE_MOTOR", "camelot")
+
+# OCR das páginas sem camada de texto (digitalizadas): resolução da imagem,
+# idioma do Tesseract e processos do pool, compartilhado entre as sessões
+# (OCR_WORKERS = 1 faz o OCR no próprio processo)
+OCR_DPI = int(os.environ.get("CONTRACHEQUE_OCR_DPI", 300))
+OCR_IDIOMA = os.environ.get("CONTRACHEQUE_OCR_IDIOMA", "por")
+OCR_WORKERS = int(os.environ.get("CONTRACHEQUE_OCR_WORKERS", min(2, os.cpu_count() or 1)))
+OCR_CACHE_MAX_PAGINAS = 512
+
+# Threads usadas pelo rapidfuzz no cruzamento com o glossário (-1 = todas)
+MATCH_WORKERS = int(os.environ.get("CONTRACHEQUE_MATCH_WORKERS", -1))
+
+# Diagnóstico: expander com os tempos das etapas (e perfil sob demanda), só
+# com CONTRACHEQUE_DIAGNOSTICO=1. Os registros também saem no logger
+# "contracheque.etapas" (ver diagnostico.py)
+DIAGNOSTICO_ATIVO = os.environ.get("CONTRACHEQUE_DIAGNOSTICO", "0") == "1"
+DIAGNOSTICO_MAX_REGISTROS = 2000
 
 
 ###############################################################################
@@ -65,45 +139,206 @@ def sanitizar_para_arquivo(texto: str) -> str:
     return texto
 
 
+###############################################################################
+# ÍNDICE DE TEXTO DO PDF (aberto uma única vez por documento)
+###############################################################################
+class IndiceTextoPDF:
+    """
+    Abre o PDF uma única vez e extrai o texto de cada página sob demanda
+    (na primeira consulta), servindo nome, matrícula e a competência
+    (MM/AAAA) de cada página sem reabrir o arquivo.
+    """
+
+    def __init__(self, origem):
+        if isinstance(origem, (bytes, bytearray)):
+            dados = bytes(origem)
+        else:
+            with open(origem, 'rb') as f:
+                dados = f.read()
+        self._reader = PdfReader(BytesIO(dados))
+        self._textos = [None] * len(self._reader.pages)
+        self._competencias = {}
+
+    @property
+    def num_paginas(self):
+        return len(self._textos)
+
+    def texto_pagina(self, page_number):
+        # page_number é 1-based, como em table.page do Camelot
+        i = page_number - 1
+        if i < 0 or i >= len(self._textos):
+            return ""
+        if self._textos[i] is None:
+            try:
+                self._textos[i] = self._reader.pages[i].extract_text() or ""
+            except Exception:
+                self._textos[i] = ""
+        return self._textos[i]
+
+    def definir_texto(self, page_number, texto):
+        # Texto já lido por outro caminho (motor de texto ou OCR)
+        self._textos[page_number - 1] = texto
+        self._competencias.pop(page_number, None)
+
+    def competencia(self, page_number):
+        if page_number not in self._competencias:
+            match = re.search(r"\d{2}/\d{4}", self.texto_pagina(page_number))
+            self._competencias[page_number] = match.group(0) if match else "N/D"
+        return self._competencias[page_number]
+
+
+def abrir_indice_texto(origem):
+    if isinstance(origem, IndiceTextoPDF):
+        return origem
+    with medir_etapa("abrir_pdf") as etapa:
+        indice = IndiceTextoPDF(origem)
+        etapa["paginas"] = indice.num_paginas
+    return indice
+
+
 ###############################################################################
 # FUNÇÃO PARA EXTRAIR NOME E MATRÍCULA (do PDF – não exibidos)
 ###############################################################################
-def extrair_nome_e_matricula(pdf_path):
+def extrair_nome_e_matricula(indice):
+    indice = abrir_indice_texto(indice)
     nome = "N/D"
     matricula = "N/D"
-    with open(pdf_path, 'rb') as f:
-        reader = PdfReader(f)
-        if len(reader.pages) > 0:
-            text = reader.pages[0].extract_text() or ""
-            lines = text.split('\n')
-            for i, linha in enumerate(lines):
-                if "NOME" in linha.upper():
-                    if i + 1 < len(lines):
-                        valor_nome = lines[i + 1].strip()
-                        match_nome = re.match(r"([^\d]+)", valor_nome)
-                        if match_nome:
-                            nome = match_nome.group(1).strip()
-                if "MATRÍCULA-SEQ-DIG" in linha.upper():
-                    if i + 1 < len(lines):
-                        valor_matr = lines[i + 1].strip()
-                        matr_match = re.search(r"(\d{3}\.\d{3}-\d\s*[A-Z]*)", valor_matr)
-                        if matr_match:
-                            matricula = matr_match.group(1).strip()
+    if indice.num_paginas > 0:
+        text = indice.texto_pagina(1)
+        lines = text.split('\n')
+        for i, linha in enumerate(lines):
+            if "NOME" in linha.upper():
+                if i + 1 < len(lines):
+                    valor_nome = lines[i + 1].strip()
+                    match_nome = re.match(r"([^\d]+)", valor_nome)
+                    if match_nome:
+                        nome = match_nome.group(1).strip()
+            if "MATRÍCULA-SEQ-DIG" in linha.upper():
+                if i + 1 < len(lines):
+                    valor_matr = lines[i + 1].strip()
+                    matr_match = re.search(r"(\d{3}\.\d{3}-\d\s*[A-Z]*)", valor_matr)
+                    if matr_match:
+                        matricula = matr_match.group(1).strip()
     return nome or "N/D", matricula or "N/D"
 
 
 ###############################################################################
 # FUNÇÃO PARA LIMPAR VALOR
 ###############################################################################
+_TABELA_LIMPEZA_VALOR = str.maketrans({" ": None, ".": None, ",": "."})
+_RE_NUMERO = re.compile(r"[\d\.]+")
+
+
 def limpar_valor(valor):
     if isinstance(valor, str):
-        v = valor.replace(" ", "").replace(".", "").replace(",", ".")
-        match_val = re.search(r"[\d\.]+", v)
+        match_val = _RE_NUMERO.search(valor.translate(_TABELA_LIMPEZA_VALOR))
         if match_val:
             return match_val.group(0)
     return valor
 
 
+def limpar_valores(serie: pd.Series) -> pd.Series:
+    # Versão para uma coluna inteira: percorre o array NumPy com a tabela de
+    # tradução e a regex já compiladas, sem o custo de Series.apply
+    return pd.Series([limpar_valor(v) for v in serie.to_numpy()], index=serie.index, name=serie.name, dtype=object)
+
+
+###############################################################################
+# VALORES MONETÁRIOS EM CENTAVOS (Int64) E FORMATAÇÃO PARA EXIBIÇÃO
+###############################################################################
+# GANHOS e DESCONTOS circulam pelo pipeline como inteiros em centavos (Int64,
+# com <NA> para célula vazia). A conversão para texto BRL ou en-US acontece
+# apenas na exibição/relatórios, em formatar_centavos/formatar_para_exibicao.
+COLUNAS_MONETARIAS = ["GANHOS", "DESCONTOS"]
+
+
+def valores_para_centavos(serie: pd.Series) -> pd.Series:
+    # Recebe a saída de limpar_valores ("807.63"); o que não for número vira <NA>
+    numeros = pd.to_numeric(serie, errors="coerce")
+    return (numeros * 100).round().astype("Int64")
+
+
+def texto_para_centavos(texto) -> int:
+    """
+    Converte um valor digitado ("1.234,56", "1,234.56", "100,5", "100") em
+    centavos. O último separador presente é tratado como o decimal.
+    Retorna 0 se o texto não for um número.
+    """
+    v = str(texto or "").strip().replace(" ", "").replace("R$", "")
+    if "," in v and "." in v:
+        if v.rfind(",") > v.rfind("."):
+            v = v.replace(".", "").replace(",", ".")
+        else:
+            v = v.replace(",", "")
+    else:
+        v = v.replace(",", ".")
+    try:
+        return int(round(float(v) * 100))
+    except ValueError:
+        return 0
+
+
+def formatar_centavos(centavos, formato="brl") -> str:
+    if centavos is None or pd.isna(centavos):
+        return ""
+    centavos = int(centavos)
+    sinal = "-" if centavos < 0 else ""
+    inteiro, resto = divmod(abs(centavos), 100)
+    texto = f"{sinal}{inteiro:,}.{resto:02d}"
+    if formato == "brl":
+        texto = texto.replace(",", "X").replace(".", ",").replace("X", ".")
+    return texto
+
+
+def formatar_para_exibicao(df: pd.DataFrame, formato="brl") -> pd.DataFrame:
+    # Ponto único de conversão para texto (tela, PDF e DOCX)
+    df_fmt = df.copy(deep=False)
+    for col in COLUNAS_MONETARIAS:
+        if col in df_fmt.columns:
+            df_fmt[col] = [formatar_centavos(v, formato) for v in df_fmt[col].to_numpy()]
+    if "DATA" in df_fmt.columns:
+        df_fmt["DATA"] = formatar_competencias(df_fmt["DATA"])
+    return df_fmt
+
+
+###############################################################################
+# ESQUEMA COMPACTO DO EXTRATO (category, int16 e competência mensal)
+###############################################################################
+# No df_completo, COD, DESCRIÇÃO e DOCUMENTO são category (as mesmas rubricas
+# se repetem em todas as páginas), PAGINA é int16 e DATA é a competência
+# mensal (period[M], NaT quando não encontrada); os valores seguem em
+# centavos (Int64). O texto "MM/AAAA" ou "N/D" só volta na exibição.
+COLUNAS_CATEGORICAS = ["COD", "DESCRIÇÃO", "DOCUMENTO"]
+
+
+def competencias_para_periodo(serie: pd.Series) -> pd.Series:
+    # Converte só os valores distintos ("01/2020", "N/D", ...) e os espalha pelos códigos
+    codigos, distintos = pd.factorize(serie)
+    periodos = pd.to_datetime(pd.Index(distintos, dtype=object), format="%m/%Y", errors="coerce").to_period("M")
+    return pd.Series(periodos.take(codigos), index=serie.index, name=serie.name)
+
+
+def formatar_competencias(serie: pd.Series) -> pd.Series:
+    if not isinstance(serie.dtype, pd.PeriodDtype):
+        return serie
+    codigos, distintos = pd.factorize(serie)
+    # NaT recebe o código -1, que aponta para o "N/D" acrescentado no fim
+    textos = np.append(distintos.strftime("%m/%Y").to_numpy(dtype=object), "N/D")
+    return pd.Series(textos[codigos], index=serie.index, name=serie.name)
+
+
+def compactar_extrato(df: pd.DataFrame) -> pd.DataFrame:
+    """Converte o extrato para o esquema compacto (colunas ausentes são ignoradas)."""
+    tipos = {col: "category" for col in COLUNAS_CATEGORICAS if col in df.columns}
+    tipos.update({col: "Int64" for col in COLUNAS_MONETARIAS if col in df.columns})
+    if "PAGINA" in df.columns:
+        tipos["PAGINA"] = "int16"
+    df = df.astype(tipos)
+    if "DATA" in df.columns and not isinstance(df["DATA"].dtype, pd.PeriodDtype):
+        df = df.assign(DATA=competencias_para_periodo(df["DATA"]))
+    return df
+
+
 ###############################################################################
 # (1) ALTERAÇÃO DA FUNÇÃO DE INSERIR TOTAIS
 #    AGORA COM 4 LINHAS:
@@ -112,7 +347,15 @@ def limpar_valor(valor):
 #      Indébito (A-B)
 #      Indébito em dobro (R$)
 ###############################################################################
-def inserir_totais_na_coluna(df, col_valor):
+LINHAS_ESPECIAIS = [
+    "A = Valor Total (R$)",
+    "B = Valor Recebido - Autor (a)",
+    "Indébito (A-B)",
+    "Indébito em dobro (R$)"
+]
+
+
+def inserir_totais_na_coluna(df, col_valor, valor_recebido=None):
     """
     Antiga lógica: inseria "Valor Total (R$)" e "Em dobro (R$)".
     Agora insere 4 linhas:
@@ -121,77 +364,38 @@ def inserir_totais_na_coluna(df, col_valor):
       - Indébito (A-B)
       - Indébito em dobro (R$)
 
-    O valor B é recuperado da variável "valor_recebido" (session_state ou fallback).
+    Os valores são somados e inseridos em centavos. O valor B vem do parâmetro
+    valor_recebido ou, se omitido, da variável "valor_recebido" (session_state
+    ou fallback).
     """
     if col_valor not in df.columns:
         return df
 
-    def _to_float(x):
-        try:
-            return float(str(x).replace(',', '.').strip())
-        except:
-            return 0.0
-
-    # Soma (A)
-    soma = df[col_valor].apply(_to_float).sum()
+    # Soma (A), exata em centavos
+    soma = int(df[col_valor].sum())
     if soma == 0:
         return df
 
-    df_novo = df.copy()
-
     # Recupera o valor B do estado
-    valor_b_str = get_state_value("valor_recebido") or "0"
-    try:
-        valor_b_num = float(str(valor_b_str).replace(',', '.').strip())
-    except:
-        valor_b_num = 0.0
+    if valor_recebido is None:
+        valor_recebido = get_state_value("valor_recebido") or "0"
+    valor_b = texto_para_centavos(valor_recebido)
 
     # Calcula indebito e indebito em dobro
-    indebito = soma - valor_b_num
+    indebito = soma - valor_b
     indebito_dobro = 2 * indebito
 
-    def en_us_format(number: float) -> str:
-        return f"{number:,.2f}"
-
-    A_str = en_us_format(soma)
-    B_str = valor_b_str.strip()
-    indebito_str = en_us_format(indebito)
-    indebito_dobro_str = en_us_format(indebito_dobro)
-
-    # Linha A
-    df_novo = pd.concat([
-        df_novo,
-        pd.DataFrame({col_valor: [A_str], "DESCRIÇÃO": ["A = Valor Total (R$)"]})
-    ], ignore_index=True)
-    # Linha B
-    df_novo = pd.concat([
-        df_novo,
-        pd.DataFrame({col_valor: [B_str], "DESCRIÇÃO": ["B = Valor Recebido - Autor (a)"]})
-    ], ignore_index=True)
-    # Indébito (A-B)
-    df_novo = pd.concat([
-        df_novo,
-        pd.DataFrame({col_valor: [indebito_str], "DESCRIÇÃO": ["Indébito (A-B)"]})
-    ], ignore_index=True)
-    # Indébito em dobro
-    df_novo = pd.concat([
-        df_novo,
-        pd.DataFrame({col_valor: [indebito_dobro_str], "DESCRIÇÃO": ["Indébito em dobro (R$)"]})
-    ], ignore_index=True)
-
-    linhas_especiais = [
-        "A = Valor Total (R$)",
-        "B = Valor Recebido - Autor (a)",
-        "Indébito (A-B)",
-        "Indébito em dobro (R$)"
-    ]
-    mask_especial = df_novo["DESCRIÇÃO"].isin(linhas_especiais)
-    if "DATA" in df_novo.columns:
-        df_novo.loc[mask_especial, "DATA"] = ""
-    if "COD" in df_novo.columns:
-        df_novo.loc[mask_especial, "COD"] = ""
-
-    return df_novo
+    df_totais = pd.DataFrame({
+        col_valor: pd.array([soma, valor_b, indebito, indebito_dobro], dtype="Int64"),
+        "DESCRIÇÃO": LINHAS_ESPECIAIS,
+    })
+    # Nas linhas especiais, DATA e COD ficam vazios (a competência vira texto)
+    if "DATA" in df.columns:
+        df = df.assign(DATA=formatar_competencias(df["DATA"]))
+    for col in ("COD", "DATA"):
+        if col in df.columns:
+            df_totais[col] = ""
+    return pd.concat([df, df_totais], ignore_index=True)
 
 
 ###############################################################################
@@ -204,123 +408,382 @@ def get_image_base64(file_path):
         return base64.b64encode(img_file.read()).decode()
 
 
-# Utiliza o diretório atual para compor o caminho completo para Rubricas.txt
-def carregar_glossario(path):
+@st.cache_resource
+def obter_servico_glossarios():
+    # Compartilhado entre as sessões: cada glossário é compilado uma única vez por versão
+    return ServicoGlossarios(os.path.join(os.getcwd(), GLOSSARY_PATH),
+                             os.path.join(os.getcwd(), GLOSSARIOS_DIR), intervalo=GLOSSARIOS_INTERVALO_S)
+
+
+def obter_glossario(nome=None):
+    """GlossarioCompilado atual (ver glossario.py); o principal se nome for None."""
     try:
-        full_path = os.path.join(os.getcwd(), path)
-        with open(full_path, "r", encoding="utf-8") as f:
-            return f.read().splitlines()
+        return obter_servico_glossarios().obter(nome)
     except Exception as e:
         st.error(f"Erro ao carregar glossário: {e}")
-        return []
+        return GlossarioCompilado([])
+
+
+###############################################################################
+# AVISOS DA EXTRAÇÃO
+###############################################################################
+# Numa tarefa da fila de extrações (fora do script do Streamlit) os avisos
+# são guardados no resultado e exibidos pela sessão que o acompanha
+_avisos_extracao = contextvars.ContextVar("avisos_extracao", default=None)
+
+
+def avisar_extracao(mensagem, erro=False):
+    avisos = _avisos_extracao.get()
+    if avisos is not None:
+        avisos.append({"erro": erro, "mensagem": mensagem})
+    elif erro:
+        st.error(mensagem)
+    else:
+        st.warning(mensagem)
+
+
+###############################################################################
+# CACHE LRU COMPARTILHADO ENTRE SESSÕES E TAREFAS DA FILA
+###############################################################################
+class CacheLRU:
+    """
+    Dicionário com despejo LRU limitado a max_itens. Os caches guardados
+    com st.cache_resource são usados ao mesmo tempo pelas sessões e pelas
+    tarefas da fila de extrações, então toda consulta e gravação passa pelo
+    lock (o cálculo do valor, não: feito fora dele, pode se repetir).
+    """
+
+    def __init__(self, max_itens):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, chave):
+        with self._lock:
+            return chave in self._itens
+
+    def obter(self, chave):
+        """Valor da chave (marcado como o mais recente) ou None."""
+        with self._lock:
+            if chave not in self._itens:
+                return None
+            self._itens.move_to_end(chave)
+            return self._itens[chave]
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+        return valor
+
+
+###############################################################################
+# OCR DAS PÁGINAS SEM CAMADA DE TEXTO (cache por hash da página)
+###############################################################################
+@st.cache_resource
+def _obter_cache_ocr():
+    return CacheLRU(OCR_CACHE_MAX_PAGINAS)
+
+
+@st.cache_resource
+def obter_pool_ocr():
+    # Um único pool para todas as sessões limita os processos de OCR no servidor
+    return ProcessPoolExecutor(max_workers=OCR_WORKERS)
+
+
+# Nas tarefas da fila de extrações não há contexto do Streamlit para consultar
+# o st.cache_resource: o cache e o pool são resolvidos antes, no script
+_recursos_ocr = contextvars.ContextVar("recursos_ocr", default=None)
+
+
+def _obter_recursos_ocr():
+    """(cache, pool) do OCR."""
+    return _recursos_ocr.get() or (_obter_cache_ocr(), obter_pool_ocr())
+
+
+def _agendar_ocr(pdf_path, paginas, paralelo=True):
+    """
+    Agenda o OCR das páginas ({numero: hash}) e retorna, em ordem de página,
+    (numero, chave, obter), em que obter() devolve (df, texto), e os futures
+    enviados ao pool. Páginas já lidas vêm do cache; as demais vão para o
+    pool de OCR (ou são lidas sob demanda, no próprio processo, sem
+    paralelismo).
+    """
+    cache, pool = _obter_recursos_ocr()
+    agendadas = []
+    futuros = []
+    for numero, hash_pagina in sorted(paginas.items()):
+        chave = (hash_pagina, OCR_DPI, OCR_IDIOMA)
+        resultado = cache.obter(chave)
+        if resultado is not None:
+            agendadas.append((numero, chave, lambda r=resultado: r))
+        elif paralelo and OCR_WORKERS > 1:
+            futuro = pool.submit(ler_pagina_ocr, pdf_path, numero, OCR_DPI, OCR_IDIOMA)
+            futuros.append(futuro)
+            agendadas.append((numero, chave, futuro.result))
+        else:
+            agendadas.append((numero, chave, lambda n=numero: ler_pagina_ocr(pdf_path, n, OCR_DPI, OCR_IDIOMA)))
+    return agendadas, futuros
+
+
+def _intercalar_ocr(tabelas, agendadas, indice=None):
+    """
+    Junta às tabelas (em ordem de página) as lidas por OCR, cada uma antes
+    da primeira tabela de página maior. O texto reconhecido vai para o
+    índice (competência, nome e matrícula). Após a primeira falha do OCR
+    (ex.: Tesseract ausente), as demais páginas são puladas e um único
+    aviso é exibido no final.
+    """
+    cache, _ = _obter_recursos_ocr()
+    pendentes = list(agendadas)
+    sem_tabela = []
+    falha_ocr = None
+
+    def _ler_ate(pagina):
+        nonlocal falha_ocr
+        while pendentes and (pagina is None or pendentes[0][0] < pagina):
+            numero, chave, obter = pendentes.pop(0)
+            if falha_ocr is not None:
+                sem_tabela.append(numero)
+                continue
+            try:
+                with medir_etapa("ocr_pagina", pagina=numero, acerto=chave in cache) as etapa:
+                    df, texto = obter()
+                    etapa["linhas"] = 0 if df is None else len(df)
+            except Exception as e:
+                falha_ocr = e
+                sem_tabela.append(numero)
+                continue
+            cache.guardar(chave, (df, texto))
+            if indice is not None:
+                indice.definir_texto(numero, texto)
+            if df is None:
+                sem_tabela.append(numero)
+            else:
+                yield TabelaExtraida(numero, df)
+
+    for tabela in tabelas:
+        yield from _ler_ate(tabela.page)
+        yield tabela
+    yield from _ler_ate(None)
+    if falha_ocr is not None:
+        avisar_extracao(f"Páginas {sem_tabela} sem camada de texto não puderam ser lidas por OCR: {falha_ocr}")
+    elif sem_tabela:
+        avisar_extracao(f"Páginas {sem_tabela} sem camada de texto: o OCR não reconheceu a tabela.")
 
 
 ###############################################################################
 # EXTRAÇÃO DE TABELAS (CONTRACHEQUE) VIA CAMELOT
 ###############################################################################
-def extrair_data_da_pagina(pdf_path, page_number):
+def extrair_data_da_pagina(indice, page_number):
     try:
-        with open(pdf_path, 'rb') as f:
-            reader = PdfReader(f)
-            if page_number - 1 < len(reader.pages):
-                text = reader.pages[page_number - 1].extract_text() or ""
-                match = re.search(r"\d{2}/\d{4}", text)
-                if match:
-                    return match.group(0)
-    except:
-        pass
-    return "N/D"
+        return abrir_indice_texto(indice).competencia(page_number)
+    except Exception:
+        return "N/D"
 
 
 def _separar_linhas_multiplas(df: pd.DataFrame) -> pd.DataFrame:
-    linhas_expandidas = []
-    for _, row in df.iterrows():
-        col_split = [str(row[col]).split('\n') for col in df.columns]
-        max_splits = max(len(partes) for partes in col_split)
-        for i in range(max_splits):
-            nova_linha = {}
-            for c, nome_coluna in enumerate(df.columns):
-                partes = col_split[c]
-                nova_linha[nome_coluna] = partes[i].strip() if i < len(partes) else ''
-            linhas_expandidas.append(nova_linha)
-    return pd.DataFrame(linhas_expandidas)
-
-
-def encontrar_cabecalho(df):
-    for idx, row in df.iterrows():
-        if row.astype(str).str.contains(r"des[çc]rição", case=False, regex=True).any():
-            return idx
-    return None
-
-
-def ler_tabelas(pdf_path):
+    # Cada célula do Camelot pode trazer várias linhas separadas por "\n";
+    # as colunas com menos partes numa linha são completadas com "". As
+    # tabelas têm poucas linhas (uma página), então um laço simples sobre as
+    # tuplas sai mais barato que montar a versão vetorizada (explode/reindex),
+    # e continua à frente dela nas tabelas grandes (benchmarks/bench_linhas.py)
+    if df.empty:
+        return pd.DataFrame(columns=df.columns)
+    registros = []
+    for linha in df.itertuples(index=False, name=None):
+        partes = [str(v).split('\n') for v in linha]
+        for i in range(max(map(len, partes))):
+            registros.append([p[i].strip() if i < len(p) else '' for p in partes])
+    return pd.DataFrame(registros, columns=df.columns)
+
+
+@contextlib.contextmanager
+def caminho_para_camelot(origem):
+    """
+    O Camelot só aceita caminho de arquivo. Se origem já for um caminho, é
+    usado diretamente; se forem bytes, são gravados num diretório temporário
+    removido ao sair do bloco (inclusive em caso de exceção).
+    """
+    if not isinstance(origem, (bytes, bytearray)):
+        yield origem
+        return
+    with tempfile.TemporaryDirectory(prefix="contracheque_") as pasta:
+        caminho = os.path.join(pasta, "documento.pdf")
+        with open(caminho, "wb") as f:
+            f.write(origem)
+        yield caminho
+
+
+def iterar_tabelas(origem, num_paginas=None, paralelo=EXTRACAO_PARALELA,
+                   workers=EXTRACAO_WORKERS, paginas_por_bloco=PAGINAS_POR_BLOCO, progresso=None,
+                   motor=MOTOR_EXTRACAO, indice=None):
+    """
+    Gera as tabelas do PDF (caminho ou bytes) em ordem de página, à medida
+    que são lidas. Com o Camelot, as páginas são lidas em blocos (em
+    paralelo, num ProcessPoolExecutor, ou em série) e cada bloco é entregue
+    assim que ele e os anteriores terminam. Páginas sem tabela de cabeçalho
+    no lattice são relidas com stream.
+    Com motor="texto", as tabelas vêm da camada de texto, lida em memória
+    página a página, e o Camelot só é usado nas páginas em que o layout não
+    foi reconhecido.
+    Nos dois motores, as páginas sem camada de texto (digitalizadas) são
+    lidas por OCR, em paralelo com as demais; o texto reconhecido vai para
+    indice, se informado.
+    progresso(concluidos, total) é chamado a cada página (texto) ou bloco.
+    """
+    with medir_etapa("paginas_sem_texto") as etapa:
+        sem_texto = mapear_paginas_sem_texto(origem)
+        etapa["paginas"] = len(sem_texto)
+    if not sem_texto:
+        yield from _iterar_tabelas_do_motor(origem, num_paginas, paralelo, workers, paginas_por_bloco,
+                                            progresso, motor, indice=indice)
+        return
+    with caminho_para_camelot(origem) as pdf_path:
+        agendadas, futuros = _agendar_ocr(pdf_path, sem_texto, paralelo)
+        try:
+            tabelas = _iterar_tabelas_do_motor(pdf_path, num_paginas, paralelo, workers, paginas_por_bloco,
+                                               progresso, motor, ignorar=sem_texto, indice=indice)
+            yield from _intercalar_ocr(tabelas, agendadas, indice)
+        finally:
+            # Gerador interrompido (ou OCR que falhou): o arquivo temporário
+            # vai ser apagado, então as páginas ainda na fila não rodam mais
+            for futuro in futuros:
+                futuro.cancel()
+
+
+def _iterar_tabelas_do_motor(origem, num_paginas, paralelo, workers, paginas_por_bloco, progresso, motor,
+                             ignorar=(), indice=None):
+    # Páginas em ignorar (lidas por OCR) não passam pelo Camelot nem pelo texto.
+    # No motor de texto, o texto de cada página, lido com as palavras, vai
+    # para o índice (sem uma segunda leitura pelo PyPDF2)
+    if motor == "texto":
+        total = num_paginas if num_paginas is not None else abrir_indice_texto(origem).num_paginas
+        sem_tabela = []
+        falha_camelot = None
+        with contextlib.ExitStack() as pilha:
+            pdf_path = None
+            for numero, df, texto in iterar_paginas_texto(origem):
+                if indice is not None and numero not in ignorar:
+                    indice.definir_texto(numero, texto)
+                if df is not None:
+                    yield TabelaExtraida(numero, df)
+                elif numero in ignorar:
+                    pass
+                elif falha_camelot is None:
+                    try:
+                        if pdf_path is None:
+                            pdf_path = pilha.enter_context(caminho_para_camelot(origem))
+                        yield from ler_paginas_camelot(pdf_path, str(numero))
+                    except Exception as e:
+                        falha_camelot = e
+                        sem_tabela.append(numero)
+                else:
+                    sem_tabela.append(numero)
+                if progresso:
+                    progresso(numero, total)
+        if sem_tabela:
+            # Mantém as páginas já lidas pelo texto
+            avisar_extracao(f"Páginas {sem_tabela} não puderam ser lidas pelo Camelot: {falha_camelot}")
+        return
+    if num_paginas is None:
+        num_paginas = abrir_indice_texto(origem).num_paginas
+    blocos = dividir_em_blocos(num_paginas, paginas_por_bloco, ignorar)
+    with caminho_para_camelot(origem) as pdf_path:
+        if paralelo and workers > 1 and len(blocos) > 1:
+            yield from _iterar_tabelas_em_paralelo(pdf_path, blocos, workers, progresso)
+        else:
+            for concluidos, bloco in enumerate(blocos, start=1):
+                yield from ler_paginas_camelot(pdf_path, bloco)
+                if progresso:
+                    progresso(concluidos, len(blocos))
+
+
+def _iterar_tabelas_em_paralelo(pdf_path, blocos, workers, progresso=None):
+    with ProcessPoolExecutor(max_workers=min(workers, len(blocos))) as executor:
+        futuros = [executor.submit(ler_paginas_camelot, pdf_path, bloco) for bloco in blocos]
+        for concluidos, futuro in enumerate(futuros, start=1):
+            yield from futuro.result()
+            if progresso:
+                progresso(concluidos, len(blocos))
+
+
+def ler_tabelas(origem, num_paginas=None, progresso=None, **opcoes_extracao):
+    """Lê todas as tabelas do PDF de uma vez (ver iterar_tabelas)."""
     try:
-        import camelot
-        tables = camelot.read_pdf(
-            pdf_path,
-            pages="all",
-            flavor="lattice",
-            strip_text=''
-        )
-        if len(tables) == 0:
-            tables = camelot.read_pdf(
-                pdf_path,
-                pages="all",
-                flavor="stream",
-                strip_text=''
-            )
+        with medir_etapa("detectar_tabelas", motor=opcoes_extracao.get("motor", MOTOR_EXTRACAO)) as etapa:
+            tables = list(iterar_tabelas(origem, num_paginas=num_paginas, progresso=progresso, **opcoes_extracao))
+            etapa["tabelas"] = len(tables)
         return tables
     except Exception as e:
-        st.error(f"Erro ao ler tabelas: {e}")
+        avisar_extracao(f"Erro ao ler tabelas: {e}", erro=True)
         return []
 
 
-def ajustar_descontos_uma_pagina(df):
-    discount_values = []
-    for _, row in df.iterrows():
-        d_val = str(row["DESCONTOS"]).strip()
-        if d_val and d_val != "-":
-            discount_values.append(d_val)
-    last_ganhos_index = -1
-    for i, row in enumerate(df.iterrows()):
-        g_val = str(df.at[i, "GANHOS"]).strip()
-        if g_val and g_val != "-" and re.search(r"\d", g_val):
-            last_ganhos_index = i
-        else:
-            break
-    start_index = last_ganhos_index + 1
-    discount_index = 0
-    for i in range(0, start_index):
-        df.at[i, "DESCONTOS"] = ""
-    for i in range(start_index, len(df)):
-        if discount_index < len(discount_values):
-            df.at[i, "DESCONTOS"] = discount_values[discount_index]
-            discount_index += 1
-        else:
-            df.at[i, "DESCONTOS"] = ""
+def ajustar_descontos_por_pagina(df):
+    """
+    Realinha a coluna DESCONTOS em cada página: as linhas iniciais com
+    GANHOS ficam sem desconto e os descontos preenchidos da página, na
+    ordem, ocupam as linhas seguintes; o que sobrar fica vazio. Operação
+    vetorizada sobre o DataFrame todo (páginas em ordem crescente, índice
+    renumerado).
+    """
+    if "PAGINA" not in df.columns or df.empty:
+        return df
+    paginas = df["PAGINA"].to_numpy()
+    if (paginas == paginas[0]).all():
+        # Uma página só (o caso de _processar_pagina): sem os groupby
+        return _ajustar_descontos_uma_pagina(df.reset_index(drop=True))
+    df = df.sort_values("PAGINA", kind="stable", ignore_index=True)
+    pagina = df["PAGINA"]
+    descontos = df["DESCONTOS"]
+
+    # Linhas a partir da primeira sem GANHOS e a posição de cada uma delas
+    apos_ganhos = df["GANHOS"].isna().astype("int8").groupby(pagina).cummax().astype(bool)
+    posicao = apos_ganhos.astype("int64").groupby(pagina).cumsum() - 1
+
+    # Descontos preenchidos, compactados na ordem do documento; cada página
+    # começa no total de descontos das páginas anteriores
+    tem_desconto = descontos.notna()
+    compactados = descontos.array[tem_desconto.to_numpy()]
+    contagem = tem_desconto.astype("int64")
+    quantidade = contagem.groupby(pagina).transform("sum")
+    deslocamento = (contagem.cumsum() - contagem).groupby(pagina).transform("first")
+
+    recebe = (apos_ganhos & (posicao < quantidade)).to_numpy()
+    realinhados = pd.Series(pd.NA, index=df.index, dtype=descontos.dtype)
+    realinhados[recebe] = compactados[(deslocamento + posicao).to_numpy()[recebe]]
+    df["DESCONTOS"] = realinhados
     return df
 
 
-def ajustar_descontos_por_pagina(df):
-    if "PAGINA" not in df.columns:
-        return df
-    paginas_processadas = []
-    for page_number, group in df.groupby("PAGINA", group_keys=False):
-        group = group.reset_index(drop=True)
-        group_ajustado = ajustar_descontos_uma_pagina(group)
-        group_ajustado["PAGINA"] = page_number
-        paginas_processadas.append(group_ajustado)
-    if not paginas_processadas:
-        return df
-    return pd.concat(paginas_processadas, ignore_index=True)
+def _ajustar_descontos_uma_pagina(df):
+    # Mesmo realinhamento para um DataFrame de uma única página
+    descontos = df["DESCONTOS"]
+    sem_ganhos = df["GANHOS"].isna().to_numpy()
+    inicio = int(sem_ganhos.argmax()) if sem_ganhos.any() else len(df)
+    compactados = descontos.array[descontos.notna().to_numpy()]
+    quantidade = min(len(compactados), len(df) - inicio)
+    realinhados = pd.array([pd.NA] * len(df), dtype=descontos.dtype)
+    realinhados[inicio:inicio + quantidade] = compactados[:quantidade]
+    df["DESCONTOS"] = realinhados
+    return df
+
+
+COLUNAS_CONTRACHEQUE = ["COD", "DESCRIÇÃO", "GANHOS", "DESCONTOS"]
+COLUNAS_COMPLETO = COLUNAS_CONTRACHEQUE + ["PAGINA", "DATA"]
 
 
-def processar_contracheque(pdf_path):
-    colunas_desejadas = ["COD", "DESCRIÇÃO", "GANHOS", "DESCONTOS"]
-    colunas_finais = colunas_desejadas + ["PAGINA", "DATA"]
-    dados_finais = pd.DataFrame(columns=colunas_finais)
-    tables = ler_tabelas(pdf_path)
-    for table in tables:
+def _processar_pagina(tabelas, indice):
+    """
+    Converte as tabelas de uma mesma página no trecho do df_completo
+    (linhas separadas, valores em centavos, PAGINA, DATA e descontos
+    realinhados). Retorna None se nenhuma tabela tiver o cabeçalho esperado.
+    """
+    partes = []
+    for table in tabelas:
         df = table.df
         idx_cab = encontrar_cabecalho(df)
         if idx_cab is None:
@@ -328,36 +791,298 @@ def processar_contracheque(pdf_path):
         df = df.iloc[idx_cab + 1:].reset_index(drop=True)
         if df.shape[1] >= 7:
             df = df.iloc[:, [0, 1, 5, 6]]
-            df.columns = colunas_desejadas
+            df.columns = COLUNAS_CONTRACHEQUE
         else:
             continue
-        df = _separar_linhas_multiplas(df)
-        for col in ["GANHOS", "DESCONTOS"]:
-            df[col] = df[col].apply(limpar_valor)
-        pagina_atual = table.page
-        data_encontrada = extrair_data_da_pagina(pdf_path, pagina_atual)
-        df["PAGINA"] = pagina_atual
-        df["DATA"] = data_encontrada
-        dados_finais = pd.concat([dados_finais, df], ignore_index=True)
-    dados_finais.replace('', pd.NA, inplace=True)
-    dados_finais.dropna(how='all', inplace=True)
-    dados_finais.fillna('', inplace=True)
-    dados_finais = ajustar_descontos_por_pagina(dados_finais)
-    return dados_finais
+        with medir_etapa("separar_linhas", pagina=table.page) as etapa:
+            df = _separar_linhas_multiplas(df)
+            for col in COLUNAS_MONETARIAS:
+                df[col] = valores_para_centavos(limpar_valores(df[col]))
+            etapa["linhas"] = len(df)
+        partes.append(df)
+    if not partes:
+        return None
+    pagina_atual = tabelas[0].page
+    df = pd.concat(partes, ignore_index=True) if len(partes) > 1 else partes[0]
+    with medir_etapa("competencia_pagina", pagina=pagina_atual):
+        data_encontrada = extrair_data_da_pagina(indice, pagina_atual)
+    df["PAGINA"] = pagina_atual
+    df["DATA"] = data_encontrada
+    df = df.replace('', pd.NA).dropna(how='all')
+    for col in COLUNAS_MONETARIAS:
+        df[col] = df[col].astype("Int64")
+    colunas_texto = [c for c in df.columns if c not in COLUNAS_MONETARIAS]
+    df[colunas_texto] = df[colunas_texto].fillna('')
+    with medir_etapa("realinhar_descontos", pagina=pagina_atual, linhas=len(df)):
+        return ajustar_descontos_por_pagina(df)
+
+
+def processar_paginas(origem, indice=None, progresso=None, **opcoes_extracao):
+    """
+    Gera o df_completo página a página: cada DataFrame é entregue assim que
+    as tabelas da página são lidas e processadas. Se a leitura falhar, exibe
+    o erro e encerra com as páginas já entregues.
+    """
+    # origem: caminho do PDF ou os bytes do arquivo enviado
+    indice = abrir_indice_texto(indice if indice is not None else origem)
+    pendentes = []
+    try:
+        for table in iterar_tabelas(origem, num_paginas=indice.num_paginas, progresso=progresso, indice=indice,
+                                    **opcoes_extracao):
+            if pendentes and table.page != pendentes[0].page:
+                df = _processar_pagina(pendentes, indice)
+                pendentes = []
+                if df is not None:
+                    yield df
+            pendentes.append(table)
+    except Exception as e:
+        avisar_extracao(f"Erro ao ler tabelas: {e}", erro=True)
+        return
+    if pendentes:
+        df = _processar_pagina(pendentes, indice)
+        if df is not None:
+            yield df
+
+
+def processar_contracheque(origem, indice=None, progresso=None, por_pagina=None, **opcoes_extracao):
+    """
+    Processa o documento inteiro. por_pagina(df), se informado, recebe cada
+    página assim que fica pronta; o resultado é concatenado uma única vez.
+    """
+    paginas = []
+    for df in processar_paginas(origem, indice=indice, progresso=progresso, **opcoes_extracao):
+        if por_pagina:
+            por_pagina(df)
+        paginas.append(df)
+    if not paginas:
+        return compactar_extrato(pd.DataFrame(columns=COLUNAS_COMPLETO))
+    return compactar_extrato(pd.concat(paginas, ignore_index=True))
 
 
 ###############################################################################
-# FUNÇÕES PARA GERAÇÃO DE PDF E DOCX (mantidas inalteradas, exceto pela
-# chamada a inserir_totais_na_coluna que agora gera as 4 linhas solicitadas)
+# CACHE DE EXTRAÇÕES (chave = SHA-256 do PDF + versão do parser)
 ###############################################################################
-def formatar_valor_brl(us_string: str) -> str:
+class CacheExtracoes:
+    """
+    Guarda o resultado de processar_contracheque (df_completo, nome e
+    matrícula) entre reruns do Streamlit, com despejo LRU limitado por
+    quantidade de documentos e por bytes. Se houver diretório configurado,
+    os resultados também são gravados em Parquet e sobrevivem a reinícios.
+    """
+
+    def __init__(self, max_itens=CACHE_MAX_DOCUMENTOS, max_bytes=CACHE_MAX_BYTES, diretorio=None):
+        self.max_itens = max_itens
+        self.max_bytes = max_bytes
+        self.diretorio = diretorio or None
+        self._itens = OrderedDict()
+        self._tamanhos = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        if self.diretorio:
+            os.makedirs(self.diretorio, exist_ok=True)
+
+    @staticmethod
+    def chave(pdf_bytes, motor=None):
+        return f"{hashlib.sha256(pdf_bytes).hexdigest()}-v{versao_extracao(motor)}"
+
+    def obter(self, chave):
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                return self._itens[chave]
+        resultado = self._ler_do_disco(chave)
+        if resultado is not None:
+            self._guardar_em_memoria(chave, resultado)
+        return resultado
+
+    def guardar(self, chave, df, nome, matricula):
+        resultado = {"df": df, "nome": nome, "matricula": matricula}
+        self._guardar_em_memoria(chave, resultado)
+        self._gravar_no_disco(chave, resultado)
+        return resultado
+
+    def _guardar_em_memoria(self, chave, resultado):
+        tamanho = int(resultado["df"].memory_usage(deep=True).sum())
+        with self._lock:
+            if chave in self._itens:
+                self._total_bytes -= self._tamanhos.pop(chave)
+                del self._itens[chave]
+            self._itens[chave] = resultado
+            self._tamanhos[chave] = tamanho
+            self._total_bytes += tamanho
+            while self._itens and (len(self._itens) > self.max_itens or self._total_bytes > self.max_bytes):
+                antiga, _ = self._itens.popitem(last=False)
+                self._total_bytes -= self._tamanhos.pop(antiga)
+
+    def _caminhos(self, chave):
+        base = os.path.join(self.diretorio, chave)
+        return base + ".parquet", base + ".json"
+
+    def _ler_do_disco(self, chave):
+        if not self.diretorio:
+            return None
+        caminho_df, caminho_meta = self._caminhos(chave)
+        if not (os.path.exists(caminho_df) and os.path.exists(caminho_meta)):
+            return None
+        try:
+            with open(caminho_meta, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            df = pd.read_parquet(caminho_df)
+        except Exception:
+            return None
+        return {"df": df, "nome": meta.get("nome"), "matricula": meta.get("matricula")}
+
+    def _gravar_no_disco(self, chave, resultado):
+        if not self.diretorio:
+            return
+        caminho_df, caminho_meta = self._caminhos(chave)
+        try:
+            # Grava em arquivos temporários e troca de forma atômica
+            resultado["df"].to_parquet(caminho_df + ".tmp", index=False)
+            with open(caminho_meta + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"nome": resultado["nome"], "matricula": resultado["matricula"]}, f, ensure_ascii=False)
+            os.replace(caminho_df + ".tmp", caminho_df)
+            os.replace(caminho_meta + ".tmp", caminho_meta)
+        except Exception:
+            pass
+
+
+def versao_extracao(motor=None):
+    """
+    PARSER_VERSION com o motor de extração: um resultado só é reaproveitado
+    (no cache ou no armazém) se veio do mesmo motor.
+    """
+    return f"{PARSER_VERSION}-{motor or MOTOR_EXTRACAO}"
+
+
+@st.cache_resource
+def obter_cache_extracoes():
+    return CacheExtracoes(diretorio=CACHE_DIR)
+
+
+@st.cache_resource
+def obter_armazem():
+    return ArmazemExtracoes(ARMAZEM_PATH) if ARMAZEM_PATH else None
+
+
+def extrair_documento(pdf_bytes, cache=None, armazem=None, arquivo=None, progresso=None, por_pagina=None,
+                      **opcoes_extracao):
+    """
+    Extrai df_completo, nome e matrícula de um PDF, consultando antes o cache
+    de extrações e o armazém. Retorna um dicionário com as chaves "df", "nome"
+    e "matricula". Uma extração nova é gravada no armazém (com o nome do
+    arquivo). por_pagina(df) recebe cada página extraída (não é chamada
+    quando o resultado vem do cache ou do armazém). opcoes_extracao (motor,
+    paralelo, workers...) são repassadas a iterar_tabelas.
+    """
+    cache = cache if cache is not None else obter_cache_extracoes()
+    if armazem is None and ARMAZEM_PATH:
+        armazem = obter_armazem()
+    motor = opcoes_extracao.get("motor")
+    chave = cache.chave(pdf_bytes, motor)
+    with medir_etapa("cache_extracoes") as etapa:
+        resultado = cache.obter(chave)
+        etapa["acerto"] = resultado is not None
+    if resultado is not None:
+        return resultado
+    hash_pdf = hashlib.sha256(pdf_bytes).hexdigest()
+    if armazem is not None:
+        with medir_etapa("armazem_leitura") as etapa:
+            gravado = armazem.obter(hash_pdf, versao_extracao(motor))
+            etapa["acerto"] = gravado is not None
+        if gravado is not None:
+            return cache.guardar(chave, compactar_extrato(gravado["df"]), gravado["nome"], gravado["matricula"])
+    indice = abrir_indice_texto(pdf_bytes)
+    df = processar_contracheque(pdf_bytes, indice=indice, progresso=progresso, por_pagina=por_pagina,
+                                **opcoes_extracao)
+    # Depois da extração: numa página digitalizada, o texto vem do OCR
+    nome_cli, matr = extrair_nome_e_matricula(indice)
+    if armazem is not None and not df.empty:
+        with medir_etapa("armazem_gravacao", linhas=len(df)):
+            armazem.guardar(hash_pdf, df, nome_cli, matr, versao_extracao(motor), arquivo=arquivo)
+    return cache.guardar(chave, df, nome_cli, matr)
+
+
+###############################################################################
+# FILA DE EXTRAÇÕES (em segundo plano, sem travar a sessão)
+###############################################################################
+@st.cache_resource
+def obter_fila_extracoes():
+    return FilaTarefas(max_concorrentes=EXTRACAO_TAREFAS)
+
+
+def _executar_extracao(pdf_bytes, arquivo, cache, armazem, recursos_ocr, tarefa):
+    """
+    Corpo da tarefa da fila: extrai o documento com os callbacks de
+    andamento da tarefa e guarda os avisos e as medições feitos fora do
+    script do Streamlit. O documento fica só no cache de extrações, pela
+    chave da tarefa, e não na tarefa (que a fila mantém depois de terminada).
+    """
+    avisos = []
+    token_avisos = _avisos_extracao.set(avisos)
+    token_ocr = _recursos_ocr.set(recursos_ocr)
     try:
-        f = float(us_string.replace(",", "").replace(".", "")) / 100
-        return f"{f:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    except:
-        return us_string
+        with coletar_medicoes() as registros:
+            extrair_documento(pdf_bytes, cache=cache, armazem=armazem, arquivo=arquivo,
+                              progresso=tarefa.progresso, por_pagina=tarefa.por_pagina)
+    finally:
+        _recursos_ocr.reset(token_ocr)
+        _avisos_extracao.reset(token_avisos)
+    return {"avisos": avisos, "medicoes": registros}
+
+
+def submeter_extracoes(arquivos, fila=None, cache=None, armazem=None):
+    """
+    Envia cada (nome, bytes) à fila de extrações e retorna as tarefas, na
+    mesma ordem. Arquivos com o mesmo conteúdo (nesta ou em outra sessão)
+    compartilham a tarefa enquanto ela estiver na fila ou em execução.
+    """
+    fila = fila if fila is not None else obter_fila_extracoes()
+    cache = cache if cache is not None else obter_cache_extracoes()
+    armazem = armazem if armazem is not None else obter_armazem()
+    recursos_ocr = (_obter_cache_ocr(), obter_pool_ocr())
+    return [fila.submeter(cache.chave(dados), _executar_extracao, dados, nome, cache, armazem, recursos_ocr,
+                          arquivo=nome)
+            for nome, dados in arquivos]
+
+
+###############################################################################
+# VÁRIOS CONTRACHEQUES DO MESMO CLIENTE
+###############################################################################
+# Uma linha presente em mais de um documento (ex.: PDFs com anos sobrepostos)
+# é a mesma se coincidirem estes campos
+CHAVE_DEDUPLICACAO = ["COD", "DESCRIÇÃO", "DATA", "GANHOS", "DESCONTOS"]
+
+
+def mesclar_documentos(resultados):
+    """
+    Junta os df_completo de vários documentos num único extrato do cliente,
+    com a coluna DOCUMENTO. Uma linha repetida em documentos diferentes entra
+    uma só vez; repetições dentro do mesmo documento são mantidas (a n-ésima
+    ocorrência só é descartada se outro documento também tiver n ocorrências).
+    """
+    if len(resultados) == 1:
+        return resultados[0]["df"]
+    partes = [r["df"].assign(DOCUMENTO=r["arquivo"]) for r in resultados]
+    todos = pd.concat(partes, ignore_index=True)
+    ocorrencia = todos.groupby(["DOCUMENTO"] + CHAVE_DEDUPLICACAO, dropna=False, sort=False,
+                               observed=True).cumcount()
+    repetida = todos[CHAVE_DEDUPLICACAO].assign(_OCORRENCIA=ocorrencia).duplicated()
+    return compactar_extrato(todos[~repetida.to_numpy()].reset_index(drop=True))
 
 
+def identificar_cliente(resultados):
+    """Nome e matrícula do conjunto (valores distintos separados por " / ")."""
+    def _juntar(valores):
+        distintos = list(dict.fromkeys(v for v in valores if v and v != "N/D"))
+        return " / ".join(distintos) or "N/D"
+    return _juntar(r["nome"] for r in resultados), _juntar(r["matricula"] for r in resultados)
+
+
+###############################################################################
+# FUNÇÕES PARA GERAÇÃO DE PDF E DOCX (mantidas inalteradas, exceto pela
+# chamada a inserir_totais_na_coluna que agora gera as 4 linhas solicitadas)
+###############################################################################
 class PDFRelatorio(FPDF):
     def __init__(self, titulo, colunas, dados, linhas_especiais=False):
         super().__init__(orientation='L', unit='mm', format='A4')
@@ -371,214 +1096,467 @@ class PDFRelatorio(FPDF):
         self.set_top_margin(10)
 
     def header(self):
+        self.set_text_color(0, 0, 0)
         self.set_font('Arial', 'B', 14)
         self.cell(0, 8, self.titulo, border=False, ln=True, align='C')
         self.ln(3)
         self.set_font("Arial", "B", 10)
         self.set_fill_color(200, 220, 255)
+        # Mesmo resultado de cell(border=1, fill=True, align='C'), que pesa
+        # quando o relatório tem centenas de páginas
+        x, y = self.l_margin, self.get_y()
         for col in self.colunas:
-            self.cell(col["largura"], 8, col["nome"], border=1, align='C', fill=True)
-        self.ln()
+            self.rect(x, y, col["largura"], 8, style="DF")
+            x += col["largura"]
+        self.set_fill_color(0, 0, 0)
+        x = self.l_margin
+        for col in self.colunas:
+            self.text(x + (col["largura"] - self.get_string_width(col["nome"])) / 2,
+                      y + 4 + 0.3 * self.font_size, col["nome"])
+            x += col["largura"]
+        self.set_xy(self.l_margin, y + 8)
 
     def footer(self):
         self.set_y(-15)
+        self.set_text_color(0, 0, 0)
         self.set_font('Arial', 'I', 8)
         self.cell(0, 10, f'Página {self.page_no()}', border=False, ln=False, align='C')
 
-    def montar_tabela(self):
-        self.set_font("Arial", "", 9)
-        row_height = 7
-        for _, row in self.dados.iterrows():
+    def _aplicar_estilo(self, especial):
+        if especial:
+            self.set_font("Arial", "B", 11)
+            self.set_text_color(255, 0, 0)
+            self.set_fill_color(255, 0, 0)
+        else:
+            self.set_font("Arial", "", 9)
+            self.set_text_color(0, 0, 0)
+            self.set_fill_color(0, 0, 0)
+
+    def _grade(self, y_inicio, n_linhas, row_height):
+        # Bordas das células de um trecho da página: uma linha por fronteira
+        # em vez de um retângulo por célula
+        x_inicio = self.l_margin
+        x_fim = x_inicio + sum(col["largura"] for col in self.colunas)
+        y_fim = y_inicio + n_linhas * row_height
+        for k in range(n_linhas + 1):
+            y = y_inicio + k * row_height
+            self.line(x_inicio, y, x_fim, y)
+        x = x_inicio
+        self.line(x, y_inicio, x, y_fim)
+        for col in self.colunas:
+            x += col["largura"]
+            self.line(x, y_inicio, x, y_fim)
+
+    def _escrita_direta_disponivel(self):
+        # A escrita direta usa internos do fpdf2 (_out, _set_font_for_page e
+        # as métricas e a codificação da fonte), validados na 2.8.x; sem eles,
+        # usa cell()
+        return all(hasattr(self, a) for a in ("_out", "_set_font_for_page")) and all(hasattr(self.current_font, a) for a in ("cw", "encode_text"))
+
+    def _montar_tabela_com_cell(self, textos, especiais, row_height):
+        """Mesmo leiaute de montar_tabela, célula a célula com cell(border=1)."""
+        estilo = None
+        for i in range(len(especiais)):
             if self.get_y() + row_height + 15 > self.h:
                 self.add_page()
-
-            descricao = str(row.get("DESCRIÇÃO", ""))
-            # Ajustamos para as novas linhas especiais
-            linhas_quentes = [
-                "A = Valor Total (R$)",
-                "B = Valor Recebido - Autor (a)",
-                "Indébito (A-B)",
-                "Indébito em dobro (R$)"
-            ]
-            is_especial = (descricao in linhas_quentes)
-
-            if is_especial and self.linhas_especiais:
-                self.set_font("Arial", "B", 11)
-                self.set_text_color(255, 0, 0)
-            else:
-                self.set_font("Arial", "", 9)
-                self.set_text_color(0, 0, 0)
-
-            for col in self.colunas:
-                col_name = col["nome"]
-                valor = str(row.get(col_name, ""))
-                if col_name in ["GANHOS", "DESCONTOS"] and valor.strip():
-                    valor = formatar_valor_brl(valor)
-                self.cell(col["largura"], row_height, valor, border=1, align=col["alinhamento"])
+                estilo = None
+            especial = bool(especiais[i])
+            if especial is not estilo:
+                self._aplicar_estilo(especial)
+                estilo = especial
+            for c, col in enumerate(self.colunas):
+                self.cell(col["largura"], row_height, textos[c][i], border=1, align=col["alinhamento"])
             self.ln(row_height)
+        self._aplicar_estilo(False)
+
+    def _celulas_da_coluna(self, textos, largura, alinhamento):
+        """
+        Para o estilo corrente, devolve por célula o deslocamento x do texto
+        (como em cell()) e o operador de texto já codificado ("(...) Tj").
+        """
+        cw = self.current_font.cw
+        celulas = []
+        larguras_texto = {}
+        for texto in textos:
+            if not texto:
+                celulas.append(None)
+                continue
+            if alinhamento == "L":
+                dx = self.c_margin
+            else:
+                w = larguras_texto.get(texto)
+                if w is None:
+                    # Métricas da fonte padrão (equivale a get_string_width, sem o custo por chamada)
+                    w = larguras_texto[texto] = sum(cw.get(ch, 0) for ch in texto) * self.font_size / 1000
+                dx = largura - self.c_margin - w if alinhamento == "R" else (largura - w) / 2
+            celulas.append((dx, self.current_font.encode_text(self.normalize_text(texto))))
+        return celulas
 
-            if is_especial and self.linhas_especiais:
-                self.set_font("Arial", "", 9)
-                self.set_text_color(0, 0, 0)
-
-    def gerar_pdf(self, nome_arquivo):
+    def montar_tabela(self):
+        """
+        Desenha o corpo da tabela com o mesmo leiaute de cell(border=1), mas
+        sem passar por cell() a cada célula: os textos são convertidos e
+        medidos por coluna uma única vez, as linhas especiais são marcadas de
+        antemão, a fonte só muda quando o estilo muda e as bordas são traçadas
+        por página.
+        """
+        row_height = 7
+        n = len(self.dados)
+        textos = [
+            [str(v) for v in self.dados[col["nome"]].to_numpy()] if col["nome"] in self.dados.columns
+            else [""] * n
+            for col in self.colunas
+        ]
+        if self.linhas_especiais and "DESCRIÇÃO" in self.dados.columns:
+            especiais = self.dados["DESCRIÇÃO"].astype(str).isin(LINHAS_ESPECIAIS).to_numpy()
+        else:
+            especiais = np.zeros(n, dtype=bool)
+        x_colunas = []
+        x = self.l_margin
+        for col in self.colunas:
+            x_colunas.append(x * self.k)
+            x += col["largura"]
+
+        self._aplicar_estilo(False)
+        if not self._escrita_direta_disponivel():
+            self._montar_tabela_com_cell(textos, especiais, row_height)
+            return
+        celulas = [self._celulas_da_coluna(textos[c], col["largura"], col["alinhamento"])
+                   for c, col in enumerate(self.colunas)]
+        self._aplicar_estilo(True)
+        for i in np.flatnonzero(especiais).tolist():
+            for c, col in enumerate(self.colunas):
+                celulas[c][i] = self._celulas_da_coluna([textos[c][i]], col["largura"], col["alinhamento"])[0]
+
+        estilo = None
+        y_trecho = self.get_y()
+        linhas_trecho = 0
+        for i in range(n):
+            if self.get_y() + row_height + 15 > self.h:
+                self._grade(y_trecho, linhas_trecho, row_height)
+                self.add_page()
+                estilo = None
+                y_trecho = self.get_y()
+                linhas_trecho = 0
+            especial = bool(especiais[i])
+            y = self.get_y()
+            base = y + 0.5 * row_height + 0.3 * (11 if especial else 9) / self.k
+            if especial is not estilo:
+                self._aplicar_estilo(especial)
+                # Só o operador da fonte (e o registro dela na página); as
+                # células seguintes são escritas direto no conteúdo
+                self._out(self._set_font_for_page(self.current_font, self.font_size_pt))
+                estilo = especial
+            y_pdf = (self.h - base) * self.k
+            operacoes = [f"BT {x + coluna[i][0] * self.k:.2f} {y_pdf:.2f} Td {coluna[i][1]} ET"
+                         for x, coluna in zip(x_colunas, celulas) if coluna[i]]
+            if operacoes:
+                self._out(" ".join(operacoes))
+            self.set_y(y + row_height)
+            linhas_trecho += 1
+        if linhas_trecho:
+            self._grade(y_trecho, linhas_trecho, row_height)
+        self._aplicar_estilo(False)
+
+    def gerar_pdf(self, nome_arquivo=None):
+        # Sem nome_arquivo, devolve os bytes do PDF gerado em memória
         self.add_page()
         self.montar_tabela()
-        self.output(nome_arquivo)
+        if nome_arquivo:
+            self.output(nome_arquivo)
+            return None
+        return bytes(self.output())
 
 
 def salvar_em_pdf(dados: pd.DataFrame, titulo_pdf: str, colunas_def: list,
                   inserir_totais=False, col_valor_soma="DESCONTOS",
                   linhas_especiais=False) -> bytes:
-    for col_def in colunas_def:
-        if col_def["nome"] not in dados.columns:
-            dados[col_def["nome"]] = ""
-    df_final = dados.copy()
+    df_final = dados.assign(**{c["nome"]: "" for c in colunas_def if c["nome"] not in dados.columns})
     if inserir_totais:
         df_final = inserir_totais_na_coluna(df_final, col_valor_soma)
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf:
-        tmp_path = tmp_pdf.name
-    pdf = PDFRelatorio(titulo_pdf, colunas_def, df_final, linhas_especiais=linhas_especiais)
-    pdf.gerar_pdf(tmp_path)
-    with open(tmp_path, "rb") as f:
-        pdf_bytes = f.read()
-    os.remove(tmp_path)
-    return pdf_bytes
+    with medir_etapa("relatorio_pdf", titulo=titulo_pdf, linhas=len(df_final)):
+        df_final = formatar_para_exibicao(df_final, "brl")
+        pdf = PDFRelatorio(titulo_pdf, colunas_def, df_final, linhas_especiais=linhas_especiais)
+        return pdf.gerar_pdf()
 
 
-def to_en_us_string(val):
-    try:
-        f = float(str(val).replace(",", "."))
-        return "{:,.2f}".format(f)
-    except:
-        return str(val)
+DOCX_LARGURAS_MM = {"COD": 20, "DESCRIÇÃO": 130, "GANHOS": 40, "DESCONTOS": 40, "PAGINA": 20, "DATA": 30}
+
+
+def _xml_linhas_docx(df_fmt: pd.DataFrame, larguras_twips: list, especiais: np.ndarray) -> str:
+    """
+    Monta o XML (w:tr) de todas as linhas de uma vez. Cada coluna tem
+    alinhamento fixo e cada linha um de dois estilos de fonte (normal 9pt
+    ou especial 11pt negrito vermelho), então os trechos de XML são
+    montados uma vez e só o texto muda.
+    """
+    rpr_normal = '<w:rPr><w:sz w:val="18"/><w:szCs w:val="18"/></w:rPr>'
+    rpr_especial = ('<w:rPr><w:b/><w:color w:val="FF0000"/>'
+                    '<w:sz w:val="22"/><w:szCs w:val="22"/></w:rPr>')
+    prefixos = []
+    for col_name, largura in zip(df_fmt.columns, larguras_twips):
+        alinhamento = "left" if str(col_name).upper() == "DESCRIÇÃO" else "center"
+        prefixos.append(f'<w:tc><w:tcPr><w:tcW w:w="{largura}" w:type="dxa"/></w:tcPr>'
+                        f'<w:p><w:pPr><w:jc w:val="{alinhamento}"/></w:pPr><w:r>')
+    colunas_texto = [[xml_escape(v) for v in df_fmt[c].to_numpy()] for c in df_fmt.columns]
+    partes = []
+    for i, valores in enumerate(zip(*colunas_texto)):
+        rpr = rpr_especial if especiais[i] else rpr_normal
+        partes.append("<w:tr>")
+        for prefixo, valor in zip(prefixos, valores):
+            partes.append(f'{prefixo}{rpr}<w:t xml:space="preserve">{valor}</w:t></w:r></w:p></w:tc>')
+        partes.append("</w:tr>")
+    return "".join(partes)
 
 
 def df_to_docx_bytes(dados: pd.DataFrame, titulo: str,
-                     inserir_totais=False, col_valor_soma="DESCONTOS") -> bytes:
-    df_final = dados.copy()
-    if inserir_totais:
-        df_final = inserir_totais_na_coluna(df_final, col_valor_soma)
-    document = Document()
-    for section in document.sections:
-        section.orientation = WD_ORIENT.LANDSCAPE
-        new_width, new_height = section.page_height, section.page_width
-        section.page_width = new_width
-        section.page_height = new_height
-    titulo_heading = document.add_heading(titulo, level=1)
-    titulo_heading.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    if df_final.empty:
-        p = document.add_paragraph("DataFrame vazio - nenhum dado para exibir.")
-        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                     inserir_totais=False, col_valor_soma="DESCONTOS", valor_recebido=None) -> bytes:
+    with medir_etapa("relatorio_docx", titulo=titulo, linhas=len(dados)):
+        # Os valores já saem formatados em BRL; não há segunda passada no DOCX
+        df_final = dados
+        if inserir_totais:
+            df_final = inserir_totais_na_coluna(df_final, col_valor_soma, valor_recebido)
+        df_final = formatar_para_exibicao(df_final, "brl")
+        document = Document()
+        for section in document.sections:
+            section.orientation = WD_ORIENT.LANDSCAPE
+            new_width, new_height = section.page_height, section.page_width
+            section.page_width = new_width
+            section.page_height = new_height
+        titulo_heading = document.add_heading(titulo, level=1)
+        titulo_heading.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        if df_final.empty:
+            p = document.add_paragraph("DataFrame vazio - nenhum dado para exibir.")
+            p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            buf = BytesIO()
+            document.save(buf)
+            return buf.getvalue()
+
+        colunas = df_final.columns.tolist()
+        table = document.add_table(rows=1, cols=len(colunas))
+        table.style = 'Table Grid'
+        hdr_cells = table.rows[0].cells
+        for i, col_name in enumerate(colunas):
+            hdr_cells[i].text = str(col_name)
+            for paragraph in hdr_cells[i].paragraphs:
+                for run in paragraph.runs:
+                    run.font.bold = True
+
+        larguras_twips = []
+        for i, col_name in enumerate(colunas):
+            mm = DOCX_LARGURAS_MM.get(col_name, 25)
+            table.columns[i].width = Inches(mm / 25.4)
+            larguras_twips.append(round(mm / 25.4 * 1440))
+
+        # Linhas da Tabela, inseridas em bloco
+        df_texto = df_final.astype(object).where(df_final.notna(), "").astype(str)
+        if "DESCRIÇÃO" in df_texto.columns:
+            especiais = df_texto["DESCRIÇÃO"].isin(LINHAS_ESPECIAIS).to_numpy()
+        else:
+            especiais = np.zeros(len(df_texto), dtype=bool)
+        linhas = parse_xml(f'<w:tbl {nsdecls("w")}>{_xml_linhas_docx(df_texto, larguras_twips, especiais)}</w:tbl>')
+        table._tbl.extend(list(linhas))
+
         buf = BytesIO()
         document.save(buf)
         return buf.getvalue()
 
-    colunas = df_final.columns.tolist()
-    table = document.add_table(rows=1, cols=len(colunas))
-    table.style = 'Table Grid'
-    hdr_cells = table.rows[0].cells
-    for i, col_name in enumerate(colunas):
-        hdr_cells[i].text = str(col_name)
-        for paragraph in hdr_cells[i].paragraphs:
-            for run in paragraph.runs:
-                run.font.bold = True
-
-    width_map = {}
-    if "COD" in colunas:
-        width_map["COD"] = 20
-    if "DESCRIÇÃO" in colunas:
-        width_map["DESCRIÇÃO"] = 130
-    if "GANHOS" in colunas:
-        width_map["GANHOS"] = 40
-    if "DESCONTOS" in colunas:
-        width_map["DESCONTOS"] = 40
-    if "PAGINA" in colunas:
-        width_map["PAGINA"] = 20
-    if "DATA" in colunas:
-        width_map["DATA"] = 30
-
-    # Linhas da Tabela
-    linhas_quentes = [
-        "A = Valor Total (R$)",
-        "B = Valor Recebido - Autor (a)",
-        "Indébito (A-B)",
-        "Indébito em dobro (R$)"
-    ]
-    for _, row in df_final.iterrows():
-        descricao = str(row.get("DESCRIÇÃO", ""))
-        is_especial = (descricao in linhas_quentes)
-
-        row_cells = table.add_row().cells
-        for i, col_name in enumerate(colunas):
-            valor = str(row[col_name])
-            if col_name in ["GANHOS", "DESCONTOS"] and valor.strip():
-                valor = to_en_us_string(valor)
-            paragraph = row_cells[i].paragraphs[0]
-            run = paragraph.add_run(valor)
-            if col_name.upper() == "DESCRIÇÃO":
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-            else:
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            run.font.size = Pt(9)
-            if is_especial:
-                run.font.bold = True
-                run.font.size = Pt(11)
-                run.font.color.rgb = RGBColor(255, 0, 0)
 
-    for i, col_name in enumerate(colunas):
-        mm = width_map.get(col_name, 25)
-        table.columns[i].width = Inches(mm / 25.4)
+###############################################################################
+# RELATÓRIOS SOB DEMANDA (memorizados pelo hash do conteúdo)
+###############################################################################
+RELATORIOS_MAX_ENTRADAS = 64
 
-    buf = BytesIO()
-    document.save(buf)
-    return buf.getvalue()
 
+@st.cache_resource
+def _obter_cache_relatorios():
+    return CacheLRU(RELATORIOS_MAX_ENTRADAS)
 
-def formatar_valor_brl(valor):
-    try:
-        f = float(str(valor).replace(",", "").replace(".", "")) / 100
-        return f"{f:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    except:
-        return str(valor)
-
-
-def ajustar_valores_docx(file_input_bytes: bytes) -> bytes:
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp_in:
-        tmp_in.write(file_input_bytes)
-        tmp_in.flush()
-        input_path = tmp_in.name
-    output_path = input_path.replace(".docx", "_corrigido.docx")
-    doc = Document(input_path)
-    pattern = re.compile(r'([\d,]+\.\d{2})')
-    for para in doc.paragraphs:
-        found = pattern.findall(para.text)
-        if not found:
-            continue
-        for val_us in found:
-            val_br = formatar_valor_brl(val_us)
-            para.text = para.text.replace(val_us, val_br)
-    doc.save(output_path)
-    with open(output_path, "rb") as f:
-        final_bytes = f.read()
-    os.remove(input_path)
-    os.remove(output_path)
-    return final_bytes
+
+def chave_relatorio(dados: pd.DataFrame, *definicoes) -> str:
+    # Hash do conteúdo do DataFrame (valores, índice, colunas e dtypes) e das
+    # definições do relatório (título, colunas, opções)
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(dados, index=True).to_numpy().tobytes())
+    h.update(json.dumps([[str(c) for c in dados.columns], [str(t) for t in dados.dtypes], definicoes],
+                        ensure_ascii=False, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+def relatorio_memorizado(chave, gerar):
+    cache = _obter_cache_relatorios()
+    resultado = cache.obter(chave)
+    if resultado is None:
+        resultado = cache.guardar(chave, gerar())
+    return resultado
+
+
+def botao_download_pdf(rotulo, nome_arquivo, dados, titulo_pdf, colunas_def, **opcoes):
+    """
+    Só gera o PDF quando o usuário pede ("Gerar ..."); depois disso, e em
+    qualquer rerun com o mesmo conteúdo, o botão de download usa os bytes
+    memorizados, sem gerar o relatório de novo.
+    """
+    chave = chave_relatorio(dados, titulo_pdf, colunas_def, opcoes)
+    if chave not in _obter_cache_relatorios():
+        if not st.button(f"Gerar {rotulo}", key=f"gerar_{chave}"):
+            return
+    pdf_bytes = relatorio_memorizado(
+        chave, lambda: salvar_em_pdf(dados=dados, titulo_pdf=titulo_pdf, colunas_def=colunas_def, **opcoes))
+    st.download_button(
+        label=f"Baixar {rotulo}",
+        data=pdf_bytes,
+        file_name=nome_arquivo,
+        mime="application/pdf",
+        key=f"baixar_{chave}"
+    )
 
 
 ###############################################################################
 # Função para cruzar o Extrato de Descontos com a Lista de Rubricas
 ###############################################################################
-def cruzar_descontos_com_rubricas(df_descontos, glossary, threshold=85):
+SIMILARIDADE_MAX_ENTRADAS = 64
+
+
+@st.cache_resource
+def _obter_cache_similaridade():
+    # Mantido pelo Streamlit entre reruns (o módulo do script é reexecutado)
+    return CacheLRU(SIMILARIDADE_MAX_ENTRADAS)
+
+
+def _melhores_rubricas(descricoes: tuple, glossario: GlossarioCompilado):
+    """
+    Para cada descrição, a maior pontuação e o índice do termo do glossário
+    (GlossarioCompilado.pontuar: índice exato/prefixo e, só no que sobra,
+    process.cdist em várias threads). O resultado fica em cache por
+    (descrições, versão do glossário): mudar o limiar não repontua nada.
+    """
+    cache = _obter_cache_similaridade()
+    chave = (descricoes, glossario.versao)
+    resultado = cache.obter(chave)
+    if resultado is None:
+        resultado = cache.guardar(chave, glossario.pontuar(descricoes, workers=MATCH_WORKERS))
+    return resultado
+
+
+def cruzar_descontos_com_rubricas(df_descontos, glossary, threshold=85, incluir_melhor_rubrica=False):
+    # glossary: GlossarioCompilado ou lista de rubricas (compilada aqui)
+    if not isinstance(glossary, GlossarioCompilado):
+        glossary = GlossarioCompilado(glossary)
     if df_descontos.empty or not glossary:
         return pd.DataFrame()
-    unique_desc = df_descontos["DESCRIÇÃO"].unique()
-    mapping = {}
-    for desc in unique_desc:
-        result = process.extractOne(desc, glossary, scorer=fuzz.ratio)
-        mapping[desc] = (result is not None and result[1] >= threshold)
-    mask = df_descontos["DESCRIÇÃO"].map(mapping)
-    return df_descontos[mask]
+    with medir_etapa("cruzar_glossario", linhas=len(df_descontos), rubricas=len(glossary)) as etapa:
+        unique_desc = tuple(df_descontos["DESCRIÇÃO"].unique())
+        pontuacoes, melhores = _melhores_rubricas(unique_desc, glossary)
+        mapping = dict(zip(unique_desc, pontuacoes >= threshold))
+        mask = df_descontos["DESCRIÇÃO"].map(mapping).astype(bool)
+        df_result = df_descontos[mask]
+        etapa.update(descricoes=len(unique_desc), selecionadas=len(df_result))
+    if incluir_melhor_rubrica:
+        df_result["RUBRICA"] = df_result["DESCRIÇÃO"].map(
+            dict(zip(unique_desc, (glossary.originais[i] for i in melhores))))
+        df_result["SIMILARIDADE"] = df_result["DESCRIÇÃO"].map(dict(zip(unique_desc, pontuacoes.round(1))))
+    return df_result
+
+
+###############################################################################
+# ETAPAS DA ANÁLISE E DEFINIÇÕES DOS RELATÓRIOS (usadas no app e no lote)
+###############################################################################
+COLUNAS_PDF_COMPLETO = [
+    {"nome": "COD", "largura": 20, "alinhamento": "C"},
+    {"nome": "DESCRIÇÃO", "largura": 140, "alinhamento": "L"},
+    {"nome": "GANHOS", "largura": 30, "alinhamento": "R"},
+    {"nome": "DESCONTOS", "largura": 30, "alinhamento": "R"},
+    {"nome": "PAGINA", "largura": 20, "alinhamento": "C"},
+    {"nome": "DATA", "largura": 30, "alinhamento": "C"},
+]
+COLUNAS_PDF_DESCONTOS = [
+    {"nome": "COD", "largura": 20, "alinhamento": "C"},
+    {"nome": "DESCRIÇÃO", "largura": 160, "alinhamento": "L"},
+    {"nome": "DESCONTOS", "largura": 30, "alinhamento": "R"},
+    {"nome": "PAGINA", "largura": 20, "alinhamento": "C"},
+    {"nome": "DATA", "largura": 30, "alinhamento": "C"},
+]
+COLUNAS_PDF_FINAIS = [
+    {"nome": "COD", "largura": 20, "alinhamento": "C"},
+    {"nome": "DESCRIÇÃO", "largura": 180, "alinhamento": "L"},
+    {"nome": "DESCONTOS", "largura": 30, "alinhamento": "R"},
+    {"nome": "DATA", "largura": 30, "alinhamento": "C"},
+]
+
+
+def filtrar_descontos(df_completo):
+    df_desc = df_completo.drop(columns=["GANHOS"], errors='ignore')
+    df_desc = df_desc[df_desc["DESCONTOS"].notna()]
+    return df_desc.reset_index(drop=True)
+
+
+def resumir_descricoes(df_gloss):
+    """
+    Resumo por DESCRIÇÃO do resultado do filtro com rubricas, feito uma vez
+    com um único groupby: quantidade de linhas, total de DESCONTOS (centavos)
+    e posições das linhas de cada descrição, em ordem alfabética.
+    """
+    grupos = df_gloss.groupby("DESCRIÇÃO", observed=True, sort=False)
+    contagem = grupos["DESCONTOS"].agg(["size", "sum"])
+    contagem.index = contagem.index.astype(str)
+    contagem = contagem.sort_index()
+    return {
+        "qtd": dict(zip(contagem.index, contagem["size"].astype(int))),
+        "total": dict(zip(contagem.index, contagem["sum"].astype(int))),
+        "posicoes": {str(d): pos for d, pos in grupos.indices.items()},
+    }
+
+
+def atualizar_selecao(df_gloss, resumo, marcadas, anterior=None):
+    """
+    Seleção confirmada na etapa 4: {"descricoes", "total", "df", "df_final"}.
+    Partindo da anterior, o total A só soma as descrições marcadas agora e
+    subtrai as desmarcadas; as linhas saem das posições do resumo, sem
+    filtrar o extrato inteiro.
+    """
+    descricoes = frozenset(d for d in marcadas if d in resumo["total"])
+    if anterior is None:
+        anterior = {"descricoes": frozenset(), "total": 0}
+    total = (anterior["total"]
+             + sum(resumo["total"][d] for d in descricoes - anterior["descricoes"])
+             - sum(resumo["total"][d] for d in anterior["descricoes"] - descricoes))
+    posicoes = [resumo["posicoes"][d] for d in descricoes]
+    posicoes = np.sort(np.concatenate(posicoes)) if posicoes else np.array([], dtype=np.intp)
+    df_sel = df_gloss.take(posicoes)
+    return {"descricoes": descricoes, "total": total, "df": df_sel,
+            "df_final": montar_descontos_finais(df_sel)}
+
+
+def montar_descontos_finais(df_sel):
+    # Ordenação cronológica (DATA é a competência mensal; NaT fica no fim)
+    df_final = df_sel.assign(PAGINA=pd.to_numeric(df_sel["PAGINA"], errors='coerce').fillna(0))
+    df_final = df_final.sort_values(by=["DATA", "PAGINA"]).reset_index(drop=True)
+    return df_final[["COD", "DESCRIÇÃO", "DESCONTOS", "DATA"]]
+
+
+def gerar_relatorio_final(df_final, titulo_final, valor_recebido=None):
+    """
+    Gera o PDF e o DOCX dos Descontos Finais com as 4 linhas especiais
+    (A, B, Indébito, Indébito em dobro). Retorna (pdf_bytes, docx_bytes).
+    """
+    df_com_totais = inserir_totais_na_coluna(df_final, "DESCONTOS", valor_recebido)
+    pdf_bytes = salvar_em_pdf(
+        dados=df_com_totais,
+        titulo_pdf=titulo_final,
+        colunas_def=COLUNAS_PDF_FINAIS,
+        inserir_totais=False,     # Já inserimos manualmente
+        col_valor_soma="DESCONTOS",
+        linhas_especiais=True     # Destaca as 4 linhas
+    )
+    docx_bytes = df_to_docx_bytes(
+        dados=df_final,
+        titulo=titulo_final,
+        inserir_totais=True,      # inc. A, B, Indébito, Indébito em dobro
+        col_valor_soma="DESCONTOS",
+        valor_recebido=valor_recebido
+    )
+    return pdf_bytes, docx_bytes
 
 
 ###############################################################################
@@ -596,29 +1574,25 @@ def main():
 
     st.title("Analista de Contracheques")
 
-    # Carregar glossário (lista de Rubricas)
-    glossary_terms = carregar_glossario(GLOSSARY_PATH)
-
-    # Upload do PDF
-    uploaded_pdf = st.file_uploader(
-        "Clique no botão para enviar o arquivo PDF (Contracheque) - SEAD (com colunas GANHOS e DESCONTOS)",
-        type="pdf"
+    # Upload dos PDFs (um ou vários contracheques do mesmo cliente)
+    uploaded_pdfs = st.file_uploader(
+        "Clique no botão para enviar o(s) arquivo(s) PDF (Contracheque) - SEAD (com colunas GANHOS e DESCONTOS)",
+        type="pdf",
+        accept_multiple_files=True
     )
-    if uploaded_pdf is not None:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(uploaded_pdf.read())
-            caminho_temp = tmp.name
-
-        nome_cli, matr = extrair_nome_e_matricula(caminho_temp)
-        set_state_value("nome_cliente", nome_cli)
-        set_state_value("matricula", matr)
-
-        df = processar_contracheque(caminho_temp)
-        os.unlink(caminho_temp)
-        if not df.empty:
-            set_state_value("df_completo", df)
-        else:
-            st.warning("Não foi possível extrair as informações do PDF ou o arquivo está vazio.")
+    if uploaded_pdfs:
+        arquivos = [(f.name, f.getvalue()) for f in uploaded_pdfs]
+        resultados = acompanhar_extracoes(arquivos)
+
+        for r in resultados:
+            if r["df"].empty:
+                st.warning(f"{r['arquivo']}: Não foi possível extrair as informações do PDF ou o arquivo está vazio.")
+        resultados = [r for r in resultados if not r["df"].empty]
+        if resultados:
+            conjunto = tuple(CacheExtracoes.chave(dados) for _, dados in arquivos)
+            carregar_documentos(resultados, conjunto)
+    elif obter_armazem() is not None:
+        exibir_historico(obter_armazem())
 
     df_completo = get_state_value("df_completo")
     nome_cli_sanit = sanitizar_para_arquivo(get_state_value("nome_cliente") or "ND")
@@ -626,33 +1600,12 @@ def main():
 
     if df_completo is not None and not df_completo.empty:
         st.markdown("### DataFrame do Contracheque Completo")
-        st.dataframe(df_completo, use_container_width=True)
+        st.dataframe(formatar_para_exibicao(df_completo, "en_us"), use_container_width=True)
 
         # Item 1: PDF Completo
         titulo_completo = f"Relatório de Contracheque (Completo) - {get_state_value('nome_cliente')} / {get_state_value('matricula')}"
-        colunas_pdf_completo = [
-            {"nome": "COD", "largura": 20, "alinhamento": "C"},
-            {"nome": "DESCRIÇÃO", "largura": 140, "alinhamento": "L"},
-            {"nome": "GANHOS", "largura": 30, "alinhamento": "R"},
-            {"nome": "DESCONTOS", "largura": 30, "alinhamento": "R"},
-            {"nome": "PAGINA", "largura": 20, "alinhamento": "C"},
-            {"nome": "DATA", "largura": 30, "alinhamento": "C"},
-        ]
-        pdf_data_completo = salvar_em_pdf(
-            dados=df_completo.copy(),
-            titulo_pdf=titulo_completo,
-            colunas_def=colunas_pdf_completo,
-            inserir_totais=False,
-            col_valor_soma="DESCONTOS",
-            linhas_especiais=False
-        )
         pdf_filename_completo = f"contracheque_completo_{nome_cli_sanit}_{matr_sanit}.pdf"
-        st.download_button(
-            label="Baixar PDF (Completo)",
-            data=pdf_data_completo,
-            file_name=pdf_filename_completo,
-            mime="application/pdf"
-        )
+        botao_download_pdf("PDF (Completo)", pdf_filename_completo, df_completo, titulo_completo, COLUNAS_PDF_COMPLETO)
 
         st.markdown("## Análise de Descontos")
 
@@ -661,116 +1614,94 @@ def main():
             st.markdown("### 1) Filtrar Operações de Descontos")
             submit_desc = st.form_submit_button("Filtrar Descontos")
         if submit_desc:
-            df_desc = df_completo.drop(columns=["GANHOS"], errors='ignore')
-            df_desc = df_desc[df_desc["DESCONTOS"].str.strip() != ""]
-            df_desc.reset_index(drop=True, inplace=True)
-            set_state_value("df_descontos", df_desc)
+            set_state_value("df_descontos", filtrar_descontos(df_completo))
 
         df_descontos = get_state_value("df_descontos")
         if df_descontos is not None and not df_descontos.empty:
             st.markdown("### 2) Extrato de Descontos")
-            st.dataframe(df_descontos, use_container_width=True)
+            st.dataframe(formatar_para_exibicao(df_descontos, "en_us"), use_container_width=True)
 
             # Botão de Baixar PDF (Descontos)
             titulo_desc = f"Contracheque - Descontos - {get_state_value('nome_cliente')} / {get_state_value('matricula')}"
-            colunas_pdf_desc = [
-                {"nome": "COD", "largura": 20, "alinhamento": "C"},
-                {"nome": "DESCRIÇÃO", "largura": 160, "alinhamento": "L"},
-                {"nome": "DESCONTOS", "largura": 30, "alinhamento": "R"},
-                {"nome": "PAGINA", "largura": 20, "alinhamento": "C"},
-                {"nome": "DATA", "largura": 30, "alinhamento": "C"},
-            ]
-            pdf_data_desc = salvar_em_pdf(
-                dados=df_descontos.copy(),
-                titulo_pdf=titulo_desc,
-                colunas_def=colunas_pdf_desc,
-                inserir_totais=False,
-                col_valor_soma="DESCONTOS",
-                linhas_especiais=False
-            )
             pdf_filename_desc = f"contracheque_descontos_{nome_cli_sanit}_{matr_sanit}.pdf"
-            st.download_button(
-                label="Baixar PDF (Descontos)",
-                data=pdf_data_desc,
-                file_name=pdf_filename_desc,
-                mime="application/pdf"
-            )
+            botao_download_pdf("PDF (Descontos)", pdf_filename_desc, df_descontos, titulo_desc, COLUNAS_PDF_DESCONTOS)
 
             # (2.1) Lista das Rubricas
             st.markdown("### 2.1) Lista das Rubricas")
-            df_rubricas = pd.DataFrame({"Rubricas": glossary_terms})
+            nomes_glossarios = list(obter_servico_glossarios().disponiveis())
+            nome_glossario = None
+            if len(nomes_glossarios) > 1:
+                nome_glossario = st.selectbox("Glossário", nomes_glossarios, key="glossario_selecionado")
+            glossario = obter_glossario(nome_glossario)
+            df_rubricas = pd.DataFrame({"Rubricas": glossario.linhas})
             st.dataframe(df_rubricas, use_container_width=True)
+            st.caption(f"{len(glossario.linhas)} rubricas ({len(glossario)} após normalização) - "
+                       f"versão {glossario.versao}")
 
             # (3) Cruzamento entre Extrato de Descontos e Rubricas
             with st.form("form_filtro_gloss"):
                 st.markdown("### 3) Filtrar Descontos no Glossário (Precisão Ajustável)")
                 thresh = st.slider("Nível de Similaridade (0.1 a 1.0)", 0.1, 1.0, 0.85, 0.1)
+                mostrar_rubrica = st.checkbox("Exibir rubrica correspondente e similaridade")
                 submit_gloss = st.form_submit_button("Filtrar com Rubricas")
             if submit_gloss:
                 with st.spinner("Cruzando Extrato de Descontos com a Lista das Rubricas..."):
                     threshold_value = int(thresh * 100)
-                    df_desc_gloss = cruzar_descontos_com_rubricas(df_descontos, glossary_terms, threshold_value)
+                    df_desc_gloss = cruzar_descontos_com_rubricas(df_descontos, glossario, threshold_value,
+                                                                  incluir_melhor_rubrica=mostrar_rubrica)
                 set_state_value("df_descontos_gloss", df_desc_gloss)
-                set_state_value("df_descontos_gloss_sel", None)
+                set_state_value("versao_glossario_filtro", glossario.versao)
+                set_state_value("resumo_descricoes", None)
+            versao_filtro = get_state_value("versao_glossario_filtro")
+            if get_state_value("df_descontos_gloss") is not None and versao_filtro not in (None, glossario.versao):
+                st.info("O glossário mudou desde o último filtro: clique em \"Filtrar com Rubricas\" para atualizar.")
 
         df_descontos_gloss = get_state_value("df_descontos_gloss")
         if df_descontos_gloss is not None and not df_descontos_gloss.empty:
             st.markdown("#### Descontos x Glossário")
-            st.dataframe(df_descontos_gloss, use_container_width=True)
+            st.dataframe(formatar_para_exibicao(df_descontos_gloss, "en_us"), use_container_width=True)
             titulo_gloss = f"Descontos x Glossário - {get_state_value('nome_cliente')} / {get_state_value('matricula')}"
-            colunas_pdf_gloss = [
-                {"nome": "COD", "largura": 20, "alinhamento": "C"},
-                {"nome": "DESCRIÇÃO", "largura": 160, "alinhamento": "L"},
-                {"nome": "DESCONTOS", "largura": 30, "alinhamento": "R"},
-                {"nome": "PAGINA", "largura": 20, "alinhamento": "C"},
-                {"nome": "DATA", "largura": 30, "alinhamento": "C"},
-            ]
-            pdf_data_gloss = salvar_em_pdf(
-                dados=df_descontos_gloss.copy(),
-                titulo_pdf=titulo_gloss,
-                colunas_def=colunas_pdf_gloss,
-                inserir_totais=False,
-                col_valor_soma="DESCONTOS",
-                linhas_especiais=False
-            )
             pdf_filename_gloss = f"contracheque_descontos_glossario_{nome_cli_sanit}_{matr_sanit}.pdf"
-            st.download_button(
-                label="Baixar PDF (Descontos x Glossário)",
-                data=pdf_data_gloss,
-                file_name=pdf_filename_gloss,
-                mime="application/pdf"
-            )
+            botao_download_pdf("PDF (Descontos x Glossário)", pdf_filename_gloss, df_descontos_gloss,
+                               titulo_gloss, COLUNAS_PDF_DESCONTOS)
 
             # (4) Lista única de Descontos
-            df_gloss_origem = df_descontos_gloss
-            df_sel = get_state_value("df_descontos_gloss_sel")
-            if df_sel is None or df_sel.empty:
-                df_sel = df_gloss_origem
+            # O resumo por descrição é feito uma vez por filtro; a seleção é o
+            # conjunto de descrições marcadas (chaves estáveis dos checkboxes)
+            resumo = get_state_value("resumo_descricoes")
+            selecao = get_state_value("selecao_descontos")
+            if resumo is None:
+                resumo = resumir_descricoes(df_descontos_gloss)
+                set_state_value("resumo_descricoes", resumo)
+                if selecao is not None:
+                    # Novo filtro: mantém as descrições que continuam na lista
+                    selecao = atualizar_selecao(df_descontos_gloss, resumo, selecao["descricoes"])
+                    set_state_value("selecao_descontos", selecao)
+            marcadas_antes = selecao["descricoes"] if selecao is not None else frozenset()
             with st.form("form_inclusao_descontos"):
                 st.markdown("### 4) Lista Única de Descontos")
-                valores_unicos = sorted(df_sel["DESCRIÇÃO"].unique())
                 st.write("Marque os itens que deseja incluir:")
                 selected_descr = []
-                for i, val in enumerate(valores_unicos):
-                    qtd = df_sel[df_sel["DESCRIÇÃO"] == val].shape[0]
-                    label_str = f"{i + 1} - {val} ({qtd}x)"
-                    if st.checkbox(label_str, key=f"chk_{i}"):
+                for i, (val, qtd) in enumerate(resumo["qtd"].items()):
+                    total_str = formatar_centavos(resumo["total"][val], "en_us")
+                    label_str = f"{i + 1} - {val} ({qtd}x, {total_str})"
+                    if st.checkbox(label_str, value=val in marcadas_antes, key=f"chk_desc_{val}"):
                         selected_descr.append(val)
                 incluir_btn = st.form_submit_button("Confirmar Inclusão (Descontos)")
 
             if incluir_btn:
                 if selected_descr:
-                    df_incluido = df_sel[df_sel["DESCRIÇÃO"].isin(selected_descr)].copy()
-                    set_state_value("df_descontos_gloss_sel", df_incluido)
+                    selecao = atualizar_selecao(df_descontos_gloss, resumo, selected_descr, selecao)
+                    set_state_value("selecao_descontos", selecao)
                     st.success("Descontos selecionados com sucesso!")
                     st.markdown("#### Lista Restante após Inclusões")
-                    st.dataframe(df_incluido, use_container_width=True)
+                    st.dataframe(formatar_para_exibicao(selecao["df"], "en_us"), use_container_width=True)
                 else:
                     st.warning("Nenhuma descrição selecionada.")
 
             # (5) APRESENTAR RÚBRICAS PARA DÉBITOS (DESCONTOS FINAIS)
-            df_final_sel = get_state_value("df_descontos_gloss_sel")
-            if df_final_sel is not None and not df_final_sel.empty:
+            selecao = get_state_value("selecao_descontos")
+            if selecao is not None and selecao["descricoes"]:
                 ######################################################################
                 # INSERINDO A ETAPA "Apresentar Rúbricas para Débitos (Descontos Finais)"
                 # COM OS CAMPOS:
@@ -782,36 +1713,23 @@ def main():
 
                 st.markdown("### 5) Apresentar Rúbricas para Débitos (Descontos Finais)")
 
-                # Cópia e ordenação cronológica
-                df_final = df_final_sel.copy()
-                df_final["PAGINA"] = pd.to_numeric(df_final["PAGINA"], errors='coerce').fillna(0)
-                df_final = df_final.sort_values(by=["DATA", "PAGINA"]).reset_index(drop=True)
-                df_final = df_final[["COD", "DESCRIÇÃO", "DESCONTOS", "DATA"]]
+                df_final = selecao["df_final"]
 
-                # Cálculo de A (soma dos descontos)
-                def _to_float(x):
-                    try:
-                        return float(str(x).replace(',', '.').strip())
-                    except:
-                        return 0.0
-
-                A_val = df_final["DESCONTOS"].apply(_to_float).sum()
-                A_str = f"{A_val:,.2f}"
+                # A (soma dos descontos, em centavos) vem atualizado da seleção
+                A_val = selecao["total"]
+                A_str = formatar_centavos(A_val, "en_us")
 
                 st.write(f"A = Valor Total (R$): {A_str}")
 
                 col1, col2 = st.columns(2)
                 with col1:
                     valor_b_receb = st.text_input("B = Valor Recebido - Autor (a)", "0")
-                try:
-                    vrnum = float(valor_b_receb.replace(',', '.').strip())
-                except:
-                    vrnum = 0.0
+                vrnum = texto_para_centavos(valor_b_receb)
 
                 indebito = A_val - vrnum
                 indebito_dobro = 2 * indebito
-                indebito_str = f"{indebito:,.2f}"
-                indebito_dobro_str = f"{indebito_dobro:,.2f}"
+                indebito_str = formatar_centavos(indebito, "en_us")
+                indebito_dobro_str = formatar_centavos(indebito_dobro, "en_us")
 
                 with col2:
                     st.write(f"Indébito (A-B): {indebito_str}")
@@ -829,24 +1747,10 @@ def main():
                     matr_ = get_state_value("matricula") or "ND"
                     titulo_final = f"Descontos Finais (Cronológico) - {nome} / {matr_}"
 
-                    # Insere 4 linhas especiais (A, B, Indébito, Indébito em dobro)
-                    df_com_totais = inserir_totais_na_coluna(df_final.copy(), "DESCONTOS")
-
-                    # Gera PDF final
-                    colunas_pdf_finais = [
-                        {"nome": "COD", "largura": 20, "alinhamento": "C"},
-                        {"nome": "DESCRIÇÃO", "largura": 180, "alinhamento": "L"},
-                        {"nome": "DESCONTOS", "largura": 30, "alinhamento": "R"},
-                        {"nome": "DATA", "largura": 30, "alinhamento": "C"},
-                    ]
-                    pdf_data_finais = salvar_em_pdf(
-                        dados=df_com_totais,
-                        titulo_pdf=titulo_final,
-                        colunas_def=colunas_pdf_finais,
-                        inserir_totais=False,     # Já inserimos manualmente
-                        col_valor_soma="DESCONTOS",
-                        linhas_especiais=True     # Destaca as 4 linhas
-                    )
+                    # Gera PDF e DOCX finais com as 4 linhas especiais
+                    chave_final = chave_relatorio(df_final, titulo_final, valor_b_receb, "finais")
+                    pdf_data_finais, docx_bytes_corrigido = relatorio_memorizado(
+                        chave_final, lambda: gerar_relatorio_final(df_final, titulo_final, valor_b_receb))
                     pdf_filename_finais = f"contracheque_descontos_finais_{nome_cli_sanit}_{matr_sanit}.pdf"
                     st.download_button(
                         label="Baixar PDF (Descontos Finais - Cronológico)",
@@ -855,14 +1759,6 @@ def main():
                         mime="application/pdf"
                     )
 
-                    # Gera DOCX final
-                    docx_bytes = df_to_docx_bytes(
-                        dados=df_final.copy(),    # note: gera sem tot, mas passamos "inserir_totais=True"
-                        titulo=titulo_final,
-                        inserir_totais=True,      # inc. A, B, Indébito, Indébito em dobro
-                        col_valor_soma="DESCONTOS"
-                    )
-                    docx_bytes_corrigido = ajustar_valores_docx(docx_bytes)
                     docx_filename_finais = pdf_filename_finais.replace(".pdf", ".docx")
                     st.download_button(
                         label="Baixar DOCX (Descontos Finais - Cronológico)",
@@ -872,8 +1768,189 @@ def main():
                     )
 
 
+def acompanhar_extracoes(arquivos):
+    """
+    Envia os PDFs à fila de extrações e acompanha as tarefas. Enquanto houver
+    alguma em andamento, mostra o progresso (e as linhas já extraídas, se for
+    um só documento) e agenda um novo rerun; quando todas terminam, retorna
+    os resultados na ordem de arquivos (sem os que falharam). Avisos e
+    medições das tarefas aparecem só no carregamento de um novo conjunto.
+    """
+    tarefas = submeter_extracoes(arquivos)
+    distintas = list({id(t): t for t in tarefas}.values())
+    pendentes = [t for t in distintas if not t.terminada]
+    if pendentes:
+        # Espera uma delas (até o intervalo) e confere todas de novo: só sai
+        # do acompanhamento quando nenhuma tarefa do conjunto está pendente
+        pendentes[0].aguardar(TAREFAS_INTERVALO_S)
+        pendentes = [t for t in distintas if not t.terminada]
+    if pendentes:
+        if len(distintas) == 1:
+            tarefa = distintas[0]
+            if tarefa.estado == NA_FILA:
+                st.progress(0.0, text="Aguardando a vez na fila de extrações...")
+            else:
+                fracao = tarefa.concluidos / tarefa.total if tarefa.total else 0.0
+                st.progress(fracao, text=f"Extraindo tabelas do contracheque... ({tarefa.concluidos}/{tarefa.total})")
+            parciais = tarefa.linhas_parciais()
+            if parciais:
+                # Linhas aparecem à medida que cada página é processada
+                st.dataframe(formatar_para_exibicao(pd.concat(parciais, ignore_index=True), "en_us"),
+                             use_container_width=True)
+        else:
+            concluidos = sum(t.terminada for t in distintas)
+            st.progress(concluidos / len(distintas),
+                        text=f"Extraindo contracheques... ({concluidos}/{len(distintas)})")
+        na_fila = sum(t.estado == NA_FILA for t in distintas)
+        if na_fila:
+            st.caption(f"{na_fila} documento(s) aguardando: o servidor extrai até {EXTRACAO_TAREFAS} por vez.")
+        st.rerun()
+
+    novo_conjunto = get_state_value("documentos_carregados") != tuple(t.chave for t in tarefas)
+    cache = obter_cache_extracoes()
+    resultados, exibidas = [], set()
+    for (nome, dados), tarefa in zip(arquivos, tarefas):
+        if tarefa.estado == FALHOU:
+            st.error(f"{nome}: falha na extração ({tarefa.erro}).")
+            # Descartada a tarefa que falhou, o rerun do botão submete o arquivo de novo
+            st.button("Tentar novamente", key=f"repetir_{tarefa.chave}",
+                      on_click=obter_fila_extracoes().descartar, args=(tarefa.chave,))
+            continue
+        if novo_conjunto and id(tarefa) not in exibidas:
+            exibidas.add(id(tarefa))
+            for aviso in tarefa.resultado["avisos"]:
+                (st.error if aviso["erro"] else st.warning)(f"{nome}: {aviso['mensagem']}")
+            registrar_medicoes(tarefa.resultado["medicoes"])
+        documento = cache.obter(tarefa.chave)
+        if documento is None:
+            # Já despejado do cache: lê do armazém ou extrai de novo, aqui mesmo
+            documento = extrair_documento(dados)
+        resultados.append(dict(documento, arquivo=nome))
+    return resultados
+
+
+def limpar_marcacoes_descontos():
+    """Desmarca os checkboxes da etapa 4 (as chaves são as descrições)."""
+    try:
+        for chave in [c for c in st.session_state if str(c).startswith("chk_desc_")]:
+            del st.session_state[chave]
+    except:
+        pass
+
+
+def carregar_documentos(resultados, conjunto):
+    """
+    Põe no estado o extrato mesclado dos documentos, com nome e matrícula do
+    cliente. conjunto identifica os documentos: se mudar, as etapas da
+    análise recomeçam.
+    """
+    nome_cli, matr = identificar_cliente(resultados)
+    set_state_value("nome_cliente", nome_cli)
+    set_state_value("matricula", matr)
+    # Um novo conjunto de documentos invalida as etapas da análise
+    if get_state_value("documentos_carregados") != conjunto:
+        set_state_value("documentos_carregados", conjunto)
+        for chave_estado in ("df_descontos", "df_descontos_gloss", "resumo_descricoes", "selecao_descontos"):
+            set_state_value(chave_estado, None)
+        limpar_marcacoes_descontos()
+    df_mesclado = mesclar_documentos(resultados)
+    set_state_value("df_completo", df_mesclado)
+    if len(resultados) > 1:
+        st.markdown("### Documentos Carregados")
+        st.dataframe(pd.DataFrame({
+            "Arquivo": [r["arquivo"] for r in resultados],
+            "Nome": [r["nome"] for r in resultados],
+            "Matrícula": [r["matricula"] for r in resultados],
+            "Linhas": [len(r["df"]) for r in resultados],
+        }), use_container_width=True, hide_index=True)
+        removidas = sum(len(r["df"]) for r in resultados) - len(df_mesclado)
+        st.caption(f"{removidas} linha(s) repetida(s) entre os documentos foram desconsideradas.")
+
+
+###############################################################################
+# HISTÓRICO (casos gravados no armazém)
+###############################################################################
+def exibir_historico(armazem):
+    """Reabre um caso gravado (sem extrair o PDF de novo) e consulta totais por competência."""
+    clientes = armazem.listar_clientes()
+    if clientes.empty:
+        return
+    with st.expander("Reabrir caso salvo"):
+        opcoes = {f"{c.nome or 'N/D'} / {c.matricula or 'N/D'} ({c.documentos} documento(s), {c.linhas} linhas)":
+                  c.matricula for c in clientes.itertuples()}
+        escolhido = st.selectbox("Cliente", list(opcoes))
+        if st.button("Reabrir caso"):
+            with medir_etapa("armazem_reabrir") as etapa:
+                resultados = [dict(r, df=compactar_extrato(r["df"])) for r in armazem.abrir_caso(opcoes[escolhido])]
+                etapa["linhas"] = sum(len(r["df"]) for r in resultados)
+            carregar_documentos(resultados, tuple(r["hash"] for r in resultados))
+
+    with st.expander("Consultar histórico de todos os clientes"):
+        with st.form("form_historico"):
+            descricao = st.text_input("DESCRIÇÃO contém", "CARTAO")
+            cod = st.text_input("COD (opcional)", "")
+            coluna = st.radio("Valores", COLUNAS_MONETARIAS[::-1], horizontal=True)
+            consultar = st.form_submit_button("Consultar")
+        if consultar:
+            totais = armazem.totais_por_competencia(descricao=descricao.strip(), cod=cod.strip(), coluna=coluna)
+            if totais.empty:
+                st.warning("Nenhum lançamento encontrado.")
+            else:
+                st.dataframe(formatar_para_exibicao(totais, "en_us"), use_container_width=True, hide_index=True)
+                st.write(f"Total ({coluna}): {formatar_centavos(int(totais[coluna].sum()), 'en_us')}")
+
+
+###############################################################################
+# DIAGNÓSTICO DE DESEMPENHO (expander opcional)
+###############################################################################
+def exibir_diagnostico(registros, historico, duracao_ms, perfil=None):
+    with st.expander("Diagnóstico de desempenho"):
+        st.caption(f"Esta execução: {duracao_ms:.0f} ms, {len(registros)} etapa(s) medida(s).")
+        if registros:
+            st.markdown("**Etapas desta execução**")
+            st.dataframe(resumir_medicoes(registros), use_container_width=True, hide_index=True)
+        if historico:
+            st.markdown("**Etapas da sessão**")
+            st.dataframe(resumir_medicoes(historico), use_container_width=True, hide_index=True)
+            st.download_button(
+                label="Baixar registros (JSON)",
+                data=json.dumps(historico, ensure_ascii=False, default=str, indent=2),
+                file_name="diagnostico_etapas.json",
+                mime="application/json"
+            )
+        st.selectbox("Perfilar as próximas execuções", ["Nenhum"] + PERFILADORES, key="perfil_execucao")
+        if perfil is not None:
+            if perfil["aviso"]:
+                st.warning(perfil["aviso"])
+            st.markdown(f"**Perfil desta execução ({perfil['modo']})**")
+            st.code(perfil["relatorio"], language=None)
+
+
+def executar_com_diagnostico():
+    if not DIAGNOSTICO_ATIVO:
+        main()
+        return
+    modo_perfil = get_state_value("perfil_execucao")
+    perfil = None
+    inicio = time.perf_counter()
+    with coletar_medicoes() as registros:
+        if modo_perfil in PERFILADORES:
+            with perfilar(modo_perfil) as perfil:
+                main()
+        else:
+            main()
+    duracao_ms = (time.perf_counter() - inicio) * 1000
+
+    execucao = (get_state_value("diagnostico_execucoes") or 0) + 1
+    set_state_value("diagnostico_execucoes", execucao)
+    historico = (get_state_value("diagnostico_registros") or []) + [dict(r, execucao=execucao) for r in registros]
+    historico = historico[-DIAGNOSTICO_MAX_REGISTROS:]
+    set_state_value("diagnostico_registros", historico)
+    exibir_diagnostico(registros, historico, duracao_ms, perfil)
+
+
 if __name__ == "__main__":
-    main()
+    executar_com_diagnostico()
 
 
 
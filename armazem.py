@@ -0,0 +1,171 @@
+"""
+Armazém local (SQLite) das extrações de contracheques.
+
+Guarda as linhas normalizadas de processar_contracheque por documento (hash
+SHA-256 do PDF), com nome e matrícula do cliente. Reabrir um caso é uma
+leitura indexada, sem passar de novo pelo Camelot, e o histórico de todos os
+clientes pode ser consultado em agregado (ex.: total de descontos "CARTAO"
+por competência). Cada operação abre a sua conexão, então o mesmo arquivo
+pode ser usado pelas threads do app e pelos processos do lote.
+Este módulo não importa o Streamlit.
+"""
+import contextlib
+import sqlite3
+import time
+
+import pandas as pd
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS documentos (
+    hash TEXT PRIMARY KEY,
+    parser_version TEXT NOT NULL,
+    matricula TEXT,
+    nome TEXT,
+    arquivo TEXT,
+    linhas INTEGER NOT NULL,
+    gravado_em TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS linhas (
+    documento TEXT NOT NULL REFERENCES documentos(hash) ON DELETE CASCADE,
+    ordem INTEGER NOT NULL,
+    matricula TEXT,
+    cod TEXT,
+    descricao TEXT,
+    ganhos INTEGER,
+    descontos INTEGER,
+    pagina INTEGER,
+    competencia TEXT,
+    PRIMARY KEY (documento, ordem)
+);
+CREATE INDEX IF NOT EXISTS idx_documentos_matricula ON documentos(matricula);
+CREATE INDEX IF NOT EXISTS idx_linhas_matricula ON linhas(matricula, competencia);
+CREATE INDEX IF NOT EXISTS idx_linhas_cod ON linhas(cod, competencia);
+CREATE INDEX IF NOT EXISTS idx_linhas_competencia ON linhas(competencia);
+"""
+
+# Colunas do df_completo e as correspondentes na tabela "linhas".
+# DATA (period[M]) é gravada como "AAAA-MM", que ordena e agrupa por mês.
+COLUNAS_DF = ["COD", "DESCRIÇÃO", "GANHOS", "DESCONTOS", "PAGINA", "DATA"]
+COLUNAS_SQL = ["cod", "descricao", "ganhos", "descontos", "pagina", "competencia"]
+
+
+class ArmazemExtracoes:
+    """Extrações gravadas num arquivo SQLite, por documento e matrícula."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        with self._conectar() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(ESQUEMA)
+
+    @contextlib.contextmanager
+    def _conectar(self):
+        con = sqlite3.connect(self.caminho, timeout=30)
+        try:
+            con.execute("PRAGMA foreign_keys=ON")
+            with con:  # commit ao sair do bloco, rollback em caso de erro
+                yield con
+        finally:
+            con.close()
+
+    ###########################################################################
+    # GRAVAÇÃO E LEITURA POR DOCUMENTO
+    ###########################################################################
+    def guardar(self, hash_pdf, df, nome, matricula, parser_version, arquivo=None):
+        """Grava (ou substitui) as linhas de um documento."""
+        valores = df[COLUNAS_DF].assign(DATA=df["DATA"].dt.strftime("%Y-%m")).astype(object)
+        valores = valores.where(valores.notna(), None)
+        registros = [(hash_pdf, ordem, matricula, *linha)
+                     for ordem, linha in enumerate(valores.itertuples(index=False, name=None))]
+        with self._conectar() as con:
+            con.execute("DELETE FROM documentos WHERE hash = ?", (hash_pdf,))
+            con.execute(
+                "INSERT INTO documentos (hash, parser_version, matricula, nome, arquivo, linhas, gravado_em)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (hash_pdf, parser_version, matricula, nome, arquivo, len(df), time.strftime("%Y-%m-%dT%H:%M:%S")))
+            con.executemany(
+                f"INSERT INTO linhas (documento, ordem, matricula, {', '.join(COLUNAS_SQL)})"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", registros)
+
+    def _ler_linhas(self, con, hash_pdf):
+        df = pd.read_sql_query(
+            f"SELECT {', '.join(COLUNAS_SQL)} FROM linhas WHERE documento = ? ORDER BY ordem",
+            con, params=(hash_pdf,))
+        df.columns = COLUNAS_DF
+        df["COD"] = df["COD"].fillna("")
+        df["DESCRIÇÃO"] = df["DESCRIÇÃO"].fillna("")
+        for col in ["GANHOS", "DESCONTOS"]:
+            df[col] = df[col].astype("Int64")
+        df["DATA"] = pd.PeriodIndex(df["DATA"], freq="M")
+        return df
+
+    def obter(self, hash_pdf, parser_version):
+        """
+        Resultado gravado do documento ({"df", "nome", "matricula", "arquivo"})
+        ou None se não houver, ou se foi extraído com outra versão do parser
+        (que no app inclui o motor de extração, ver app4.versao_extracao).
+        """
+        with self._conectar() as con:
+            doc = con.execute("SELECT nome, matricula, arquivo FROM documentos"
+                              " WHERE hash = ? AND parser_version = ?", (hash_pdf, parser_version)).fetchone()
+            if doc is None:
+                return None
+            df = self._ler_linhas(con, hash_pdf)
+        return {"df": df, "nome": doc[0], "matricula": doc[1], "arquivo": doc[2]}
+
+    def abrir_caso(self, matricula):
+        """Todos os documentos gravados de uma matrícula, na ordem de gravação."""
+        with self._conectar() as con:
+            documentos = con.execute("SELECT hash, nome, matricula, arquivo FROM documentos"
+                                     " WHERE matricula = ? ORDER BY gravado_em, arquivo", (matricula,)).fetchall()
+            return [{"df": self._ler_linhas(con, h), "nome": nome, "matricula": matr, "arquivo": arquivo or h[:12],
+                     "hash": h}
+                    for h, nome, matr, arquivo in documentos]
+
+    ###########################################################################
+    # CONSULTAS
+    ###########################################################################
+    def listar_clientes(self):
+        """Uma linha por matrícula: nome, documentos, linhas e última gravação."""
+        with self._conectar() as con:
+            return pd.read_sql_query(
+                "SELECT matricula, MAX(nome) AS nome, COUNT(*) AS documentos, SUM(linhas) AS linhas,"
+                " MAX(gravado_em) AS gravado_em FROM documentos GROUP BY matricula ORDER BY nome, matricula", con)
+
+    def totais_por_competencia(self, descricao=None, cod=None, matricula=None, coluna="DESCONTOS"):
+        """
+        Total de GANHOS ou DESCONTOS por competência, em centavos, em todos os
+        clientes (ou numa matrícula). descricao filtra por trecho da DESCRIÇÃO
+        (LIKE, sem diferenciar maiúsculas) e cod pelo código exato. Como em
+        mesclar_documentos, uma linha repetida em documentos do mesmo cliente
+        conta uma só vez.
+        """
+        valor = {"GANHOS": "ganhos", "DESCONTOS": "descontos"}[coluna]
+        filtros, parametros = [f"{valor} IS NOT NULL"], []
+        if descricao:
+            filtros.append("descricao LIKE ?")
+            parametros.append(f"%{descricao}%")
+        if cod:
+            filtros.append("cod = ?")
+            parametros.append(cod)
+        if matricula:
+            filtros.append("matricula = ?")
+            parametros.append(matricula)
+        chave = "matricula, cod, descricao, competencia, ganhos, descontos"
+        consulta = f"""
+            WITH por_documento AS (
+                SELECT {chave}, COUNT(*) AS n FROM linhas
+                WHERE {' AND '.join(filtros)}
+                GROUP BY {chave}, documento
+            ), unicas AS (
+                SELECT {chave}, MAX(n) AS n FROM por_documento GROUP BY {chave}
+            )
+            SELECT competencia AS DATA, COUNT(DISTINCT matricula) AS CLIENTES,
+                   SUM(n) AS LANCAMENTOS, SUM({valor} * n) AS {coluna}
+            FROM unicas GROUP BY competencia ORDER BY competencia
+        """
+        with self._conectar() as con:
+            df = pd.read_sql_query(consulta, con, params=parametros)
+        df["DATA"] = pd.PeriodIndex(df["DATA"], freq="M")
+        df[coluna] = df[coluna].astype("Int64")
+        return df
@@ -0,0 +1,138 @@
+"""
+Benchmark de ajustar_descontos_por_pagina (vetorizada) contra a
+implementação original, página a página com df.at.
+
+Antes de medir, compara as duas em páginas aleatórias: páginas vazias,
+sem prefixo de GANHOS, sem descontos e intercaladas fora de ordem. Mede um
+DataFrame com muitas páginas e, por página, DataFrames de uma página só,
+como em _processar_pagina.
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_descontos.py [--casos 2000] [--paginas 1000] [--repeticoes 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app4  # noqa: E402
+
+
+###############################################################################
+# IMPLEMENTAÇÃO ORIGINAL (referência)
+###############################################################################
+def ajustar_descontos_uma_pagina_original(df):
+    discount_values = df["DESCONTOS"].dropna().tolist()
+    last_ganhos_index = -1
+    for i in range(len(df)):
+        if pd.notna(df.at[i, "GANHOS"]):
+            last_ganhos_index = i
+        else:
+            break
+    start_index = last_ganhos_index + 1
+    discount_index = 0
+    for i in range(0, start_index):
+        df.at[i, "DESCONTOS"] = pd.NA
+    for i in range(start_index, len(df)):
+        if discount_index < len(discount_values):
+            df.at[i, "DESCONTOS"] = discount_values[discount_index]
+            discount_index += 1
+        else:
+            df.at[i, "DESCONTOS"] = pd.NA
+    return df
+
+
+def ajustar_descontos_por_pagina_original(df):
+    if "PAGINA" not in df.columns:
+        return df
+    paginas_processadas = []
+    for page_number, group in df.groupby("PAGINA", group_keys=False):
+        group = group.reset_index(drop=True)
+        group_ajustado = ajustar_descontos_uma_pagina_original(group)
+        group_ajustado["PAGINA"] = page_number
+        paginas_processadas.append(group_ajustado)
+    if not paginas_processadas:
+        return df
+    return pd.concat(paginas_processadas, ignore_index=True)
+
+
+###############################################################################
+# PÁGINAS ALEATÓRIAS (valores em centavos, como no df_completo)
+###############################################################################
+def _valores(rng, n, preenchidos):
+    return pd.array([int(v) if p else pd.NA for v, p in zip(rng.integers(1, 10 ** 6, n), preenchidos)],
+                    dtype="Int64")
+
+
+def paginas_aleatorias(rng, max_paginas=8, max_linhas=15):
+    partes = []
+    n_paginas = int(rng.integers(1, max_paginas))
+    for pagina in rng.permutation(n_paginas * 3)[:n_paginas]:
+        n = int(rng.integers(0, max_linhas))
+        ganhos = rng.random(n) < rng.random()
+        ganhos[:int(rng.integers(0, n + 1))] = True  # prefixo de GANHOS, de tamanho variável
+        descontos = rng.random(n) < rng.random()
+        partes.append(pd.DataFrame({
+            "COD": [str(c) for c in rng.integers(0, 99, n)],
+            "GANHOS": _valores(rng, n, ganhos),
+            "DESCONTOS": _valores(rng, n, descontos),
+            "PAGINA": int(pagina),
+            "DATA": "01/2020",
+        }))
+    df = pd.concat(partes, ignore_index=True)
+    if rng.random() < 0.5:
+        # Páginas intercaladas
+        df = df.sample(frac=1, random_state=int(rng.integers(1e6))).reset_index(drop=True)
+    return df
+
+
+def _medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--casos", type=int, default=2000, help="DataFrames aleatórios comparados")
+    parser.add_argument("--paginas", type=int, default=1000, help="Páginas do DataFrame medido")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for _ in range(args.casos):
+        df = paginas_aleatorias(rng)
+        pd.testing.assert_frame_equal(app4.ajustar_descontos_por_pagina(df.copy()),
+                                      ajustar_descontos_por_pagina_original(df.copy()), check_index_type=False)
+    print(f"ajustar_descontos_por_pagina: {args.casos} casos aleatórios iguais à original")
+
+    grande = pd.concat([paginas_aleatorias(rng, max_linhas=20) for _ in range(args.paginas // 4)], ignore_index=True)
+    grande["PAGINA"] = np.arange(len(grande)) * args.paginas // len(grande)
+    t_orig, df_orig = _medir(lambda: ajustar_descontos_por_pagina_original(grande.copy()), args.repeticoes)
+    t_novo, df_novo = _medir(lambda: app4.ajustar_descontos_por_pagina(grande.copy()), args.repeticoes)
+    pd.testing.assert_frame_equal(df_novo, df_orig)
+    print(f"ajustar_descontos_por_pagina ({len(grande)} linhas, {grande['PAGINA'].nunique()} páginas): "
+          f"original {t_orig * 1000:.1f} ms | nova {t_novo * 1000:.1f} ms | {t_orig / t_novo:.1f}x")
+
+    # Por página: o pipeline realinha cada página assim que ela é extraída
+    paginas = [df for _, df in grande.groupby("PAGINA")]
+    t_orig, dfs_orig = _medir(lambda: [ajustar_descontos_por_pagina_original(df.copy()) for df in paginas],
+                              args.repeticoes)
+    t_novo, dfs_novo = _medir(lambda: [app4.ajustar_descontos_por_pagina(df.copy()) for df in paginas],
+                              args.repeticoes)
+    for df_novo, df_orig in zip(dfs_novo, dfs_orig):
+        pd.testing.assert_frame_equal(df_novo, df_orig)
+    print(f"ajustar_descontos_por_pagina por página ({len(grande) / len(paginas):.0f} linhas em média): "
+          f"original {t_orig * 1000 / len(paginas):.2f} ms | nova {t_novo * 1000 / len(paginas):.2f} ms | "
+          f"{t_orig / t_novo:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark de df_to_docx_bytes (uma passada, valores já em BRL e linhas
+montadas em bloco) contra o caminho original: tabela em en_us com
+add_row/run por célula e depois ajustar_valores_docx reabrindo o arquivo.
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_docx.py [--linhas 5000] [--repeticoes 3]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from docx import Document
+from docx.enum.section import WD_ORIENT
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.shared import Pt, Inches, RGBColor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app4  # noqa: E402
+
+
+###############################################################################
+# IMPLEMENTAÇÃO ORIGINAL (referência)
+###############################################################################
+def df_to_docx_bytes_original(dados, titulo, inserir_totais=False, col_valor_soma="DESCONTOS", valor_recebido=None):
+    df_final = dados.copy()
+    if inserir_totais:
+        df_final = app4.inserir_totais_na_coluna(df_final, col_valor_soma, valor_recebido)
+    df_final = app4.formatar_para_exibicao(df_final, "en_us")
+    document = Document()
+    for section in document.sections:
+        section.orientation = WD_ORIENT.LANDSCAPE
+        section.page_width, section.page_height = section.page_height, section.page_width
+    document.add_heading(titulo, level=1).alignment = WD_ALIGN_PARAGRAPH.CENTER
+    colunas = df_final.columns.tolist()
+    table = document.add_table(rows=1, cols=len(colunas))
+    table.style = 'Table Grid'
+    for i, col_name in enumerate(colunas):
+        table.rows[0].cells[i].text = str(col_name)
+    for _, row in df_final.iterrows():
+        is_especial = str(row.get("DESCRIÇÃO", "")) in app4.LINHAS_ESPECIAIS
+        row_cells = table.add_row().cells
+        for i, col_name in enumerate(colunas):
+            paragraph = row_cells[i].paragraphs[0]
+            run = paragraph.add_run(str(row[col_name]))
+            paragraph.alignment = (WD_ALIGN_PARAGRAPH.LEFT if col_name.upper() == "DESCRIÇÃO"
+                                   else WD_ALIGN_PARAGRAPH.CENTER)
+            run.font.size = Pt(9)
+            if is_especial:
+                run.font.bold = True
+                run.font.size = Pt(11)
+                run.font.color.rgb = RGBColor(255, 0, 0)
+    for i, col_name in enumerate(colunas):
+        table.columns[i].width = Inches(app4.DOCX_LARGURAS_MM.get(col_name, 25) / 25.4)
+    buf = BytesIO()
+    document.save(buf)
+    return buf.getvalue()
+
+
+def ajustar_valores_docx_original(file_input_bytes):
+    doc = Document(BytesIO(file_input_bytes))
+    pattern = re.compile(r'([\d,]+\.\d{2})')
+    for para in doc.paragraphs:
+        for val_us in pattern.findall(para.text):
+            para.text = para.text.replace(
+                val_us, app4.formatar_centavos(app4.texto_para_centavos(val_us), "brl"))
+    buf = BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+###############################################################################
+# DESCONTOS FINAIS SINTÉTICOS (centavos Int64)
+###############################################################################
+def descontos_sinteticos(n_linhas, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "COD": [f"{c:04d}" for c in rng.integers(1, 9999, size=n_linhas)],
+        "DESCRIÇÃO": [f"RUBRICA {c}" for c in rng.integers(1, 500, size=n_linhas)],
+        "DESCONTOS": pd.array(rng.integers(1, 50_000_000, size=n_linhas), dtype="Int64"),
+        "DATA": [f"{m:02d}/{a}" for m, a in zip(rng.integers(1, 13, size=n_linhas),
+                                                 rng.integers(2010, 2024, size=n_linhas))],
+    })
+
+
+def _textos_da_tabela(docx_bytes):
+    tabela = Document(BytesIO(docx_bytes)).tables[0]
+    return [[c.text for c in linha.cells] for linha in tabela.rows[1:]]
+
+
+def _medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=5000)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    df = descontos_sinteticos(args.linhas)
+    opcoes = {"inserir_totais": True, "col_valor_soma": "DESCONTOS", "valor_recebido": "1.234,56"}
+    t_orig, docx_orig = _medir(
+        lambda: ajustar_valores_docx_original(df_to_docx_bytes_original(df, "Benchmark", **opcoes)),
+        args.repeticoes)
+    t_novo, docx_novo = _medir(lambda: app4.df_to_docx_bytes(df, "Benchmark", **opcoes), args.repeticoes)
+
+    # Mesmas células; a versão nova já traz os valores em BRL (a original
+    # deixava a tabela em en_us, pois o ajuste só percorria os parágrafos)
+    esperado = app4.formatar_para_exibicao(app4.inserir_totais_na_coluna(
+        df, "DESCONTOS", opcoes["valor_recebido"]), "brl").fillna("").astype(str).values.tolist()
+    assert _textos_da_tabela(docx_novo) == esperado
+    assert len(_textos_da_tabela(docx_orig)) == len(esperado)
+    print(f"df_to_docx_bytes ({len(esperado)} linhas): "
+          f"original + ajuste {t_orig * 1000:.0f} ms | nova {t_novo * 1000:.0f} ms | {t_orig / t_novo:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
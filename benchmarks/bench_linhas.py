@@ -0,0 +1,146 @@
+"""
+Benchmark de _separar_linhas_multiplas e limpar_valores contra as
+implementações originais com iterrows/apply (e a separação vetorizada com
+explode/reindex, usada antes do laço atual).
+
+Mede uma tabela grande e, por tabela, muitas tabelas do tamanho de uma
+página: no formato do Camelot (uma linha com várias partes por célula) e
+no do motor de texto (uma parte por célula).
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_linhas.py [--linhas 10000] [--tabelas 500] [--linhas-tabela 10] [--repeticoes 5]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app4  # noqa: E402
+
+
+###############################################################################
+# IMPLEMENTAÇÕES ORIGINAIS (referência)
+###############################################################################
+def separar_linhas_multiplas_original(df):
+    linhas_expandidas = []
+    for _, row in df.iterrows():
+        col_split = [str(row[col]).split('\n') for col in df.columns]
+        max_splits = max(len(partes) for partes in col_split)
+        for i in range(max_splits):
+            nova_linha = {}
+            for c, nome_coluna in enumerate(df.columns):
+                partes = col_split[c]
+                nova_linha[nome_coluna] = partes[i].strip() if i < len(partes) else ''
+            linhas_expandidas.append(nova_linha)
+    return pd.DataFrame(linhas_expandidas)
+
+
+def separar_linhas_multiplas_vetorizada(df):
+    if df.empty:
+        return pd.DataFrame(columns=df.columns)
+    partes = {col: df[col].astype(str).str.split('\n') for col in df.columns}
+    tamanhos = pd.concat([p.str.len() for p in partes.values()], axis=1).max(axis=1).to_numpy()
+    linhas = np.repeat(np.arange(len(df)), tamanhos)
+    posicoes = np.arange(len(linhas)) - np.repeat(np.cumsum(tamanhos) - tamanhos, tamanhos)
+    grade = pd.MultiIndex.from_arrays([linhas, posicoes])
+    colunas = {}
+    for col, serie in partes.items():
+        serie = serie.reset_index(drop=True).explode()
+        serie.index = pd.MultiIndex.from_arrays([serie.index, serie.groupby(level=0).cumcount().to_numpy()])
+        colunas[col] = serie.reindex(grade, fill_value='').str.strip().to_numpy()
+    return pd.DataFrame(colunas, columns=df.columns)
+
+
+def limpar_valor_original(valor):
+    if isinstance(valor, str):
+        v = valor.replace(" ", "").replace(".", "").replace(",", ".")
+        match_val = re.search(r"[\d\.]+", v)
+        if match_val:
+            return match_val.group(0)
+    return valor
+
+
+###############################################################################
+# TABELA SINTÉTICA NO FORMATO DO CAMELOT (células com várias linhas)
+###############################################################################
+def tabela_sintetica(n_linhas, seed=0, max_partes=11):
+    # max_partes=1: uma rubrica por célula, como nas tabelas do motor de texto
+    rng = np.random.default_rng(seed)
+    registros = []
+    total = 0
+    while total < n_linhas:
+        k = int(rng.integers(1, max_partes + 1))
+        n_ganhos = int(rng.integers(0, k + 1))
+        valores = [f"{v:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+                   for v in rng.uniform(1, 5000, size=k)]
+        registros.append({
+            "COD": "\n".join(f"{c:04d}" for c in rng.integers(1, 9999, size=k)),
+            "DESCRIÇÃO": "\n".join(f"RUBRICA {c}" for c in rng.integers(1, 500, size=k)),
+            "GANHOS": "\n".join(valores[:n_ganhos]),
+            "DESCONTOS": "\n".join(valores[n_ganhos:]) if n_ganhos < k else "-",
+        })
+        total += k
+    return pd.DataFrame(registros)
+
+
+def _medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=10000)
+    parser.add_argument("--tabelas", type=int, default=500, help="Tabelas medidas por tabela")
+    parser.add_argument("--linhas-tabela", type=int, default=10, help="Rubricas de cada tabela")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    tabela = tabela_sintetica(args.linhas)
+    t_orig, df_orig = _medir(lambda: separar_linhas_multiplas_original(tabela), args.repeticoes)
+    t_vet, df_vet = _medir(lambda: separar_linhas_multiplas_vetorizada(tabela), args.repeticoes)
+    t_novo, df_novo = _medir(lambda: app4._separar_linhas_multiplas(tabela), args.repeticoes)
+    pd.testing.assert_frame_equal(df_novo, df_orig)
+    pd.testing.assert_frame_equal(df_vet, df_orig)
+    print(f"_separar_linhas_multiplas ({len(df_novo)} linhas): original {t_orig * 1000:.1f} ms | "
+          f"vetorizada {t_vet * 1000:.1f} ms | nova {t_novo * 1000:.1f} ms | {t_orig / t_novo:.1f}x")
+
+    # Por tabela: o pipeline separa as linhas de uma página por vez
+    for formato, max_partes in (("camelot", 11), ("texto", 1)):
+        tabelas = [tabela_sintetica(args.linhas_tabela, seed=s, max_partes=max_partes) for s in range(args.tabelas)]
+        tempos = {}
+        for nome, funcao in (("original", separar_linhas_multiplas_original),
+                             ("vetorizada", separar_linhas_multiplas_vetorizada),
+                             ("nova", app4._separar_linhas_multiplas)):
+            tempos[nome], resultados = _medir(lambda: [funcao(t) for t in tabelas], args.repeticoes)
+            if nome == "original":
+                referencias = resultados
+            else:
+                for df, ref in zip(resultados, referencias):
+                    pd.testing.assert_frame_equal(df, ref)
+        por_tabela = {nome: t * 1000 / len(tabelas) for nome, t in tempos.items()}
+        print(f"_separar_linhas_multiplas por tabela ({formato}, {args.linhas_tabela} rubricas): "
+              f"original {por_tabela['original']:.2f} ms | vetorizada {por_tabela['vetorizada']:.2f} ms | "
+              f"nova {por_tabela['nova']:.2f} ms | {tempos['original'] / tempos['nova']:.1f}x")
+
+    t_orig, v_orig = _medir(lambda: {c: df_orig[c].apply(limpar_valor_original) for c in ("GANHOS", "DESCONTOS")},
+                            args.repeticoes)
+    t_novo, v_novo = _medir(lambda: {c: app4.limpar_valores(df_novo[c]) for c in ("GANHOS", "DESCONTOS")},
+                            args.repeticoes)
+    for c in v_orig:
+        pd.testing.assert_series_equal(v_novo[c], v_orig[c])
+    print(f"limpar_valores (2 colunas): "
+          f"original {t_orig * 1000:.1f} ms | nova {t_novo * 1000:.1f} ms | {t_orig / t_novo:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
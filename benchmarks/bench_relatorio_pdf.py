@@ -0,0 +1,93 @@
+"""
+Benchmark de PDFRelatorio.montar_tabela (colunas formatadas e medidas uma
+vez, fonte trocada só na mudança de estilo) contra a implementação original
+com iterrows/cell() por célula.
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_relatorio_pdf.py [--linhas 10000] [--repeticoes 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import pypdfium2 as pdfium
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app4  # noqa: E402
+from bench_docx import descontos_sinteticos  # noqa: E402
+
+
+###############################################################################
+# IMPLEMENTAÇÃO ORIGINAL (referência)
+###############################################################################
+class PDFRelatorioOriginal(app4.PDFRelatorio):
+    def header(self):
+        self.set_font('Arial', 'B', 14)
+        self.cell(0, 8, self.titulo, border=False, ln=True, align='C')
+        self.ln(3)
+        self.set_font("Arial", "B", 10)
+        self.set_fill_color(200, 220, 255)
+        for col in self.colunas:
+            self.cell(col["largura"], 8, col["nome"], border=1, align='C', fill=True)
+        self.ln()
+
+    def montar_tabela(self):
+        self.set_font("Arial", "", 9)
+        row_height = 7
+        for _, row in self.dados.iterrows():
+            if self.get_y() + row_height + 15 > self.h:
+                self.add_page()
+            is_especial = str(row.get("DESCRIÇÃO", "")) in app4.LINHAS_ESPECIAIS
+            if is_especial and self.linhas_especiais:
+                self.set_font("Arial", "B", 11)
+                self.set_text_color(255, 0, 0)
+            else:
+                self.set_font("Arial", "", 9)
+                self.set_text_color(0, 0, 0)
+            for col in self.colunas:
+                self.cell(col["largura"], row_height, str(row.get(col["nome"], "")),
+                          border=1, align=col["alinhamento"])
+            self.ln(row_height)
+
+
+def _gerar(classe, df_fmt):
+    return bytes(classe("Benchmark", app4.COLUNAS_PDF_FINAIS, df_fmt, linhas_especiais=True).gerar_pdf())
+
+
+def _palavras_por_pagina(pdf_bytes):
+    # Texto de cada página, sem depender da ordem em que foi desenhado
+    pdf = pdfium.PdfDocument(pdf_bytes)
+    try:
+        return [sorted(pagina.get_textpage().get_text_range().split()) for pagina in pdf]
+    finally:
+        pdf.close()
+
+
+def _medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=10000)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    df_fmt = app4.formatar_para_exibicao(
+        app4.inserir_totais_na_coluna(descontos_sinteticos(args.linhas), "DESCONTOS", "1.234,56"), "brl")
+    df_fmt = df_fmt.fillna("")
+    t_orig, pdf_orig = _medir(lambda: _gerar(PDFRelatorioOriginal, df_fmt), args.repeticoes)
+    t_novo, pdf_novo = _medir(lambda: _gerar(app4.PDFRelatorio, df_fmt), args.repeticoes)
+    assert _palavras_por_pagina(pdf_novo) == _palavras_por_pagina(pdf_orig)
+    print(f"PDFRelatorio ({len(df_fmt)} linhas): "
+          f"original {t_orig * 1000:.0f} ms | nova {t_novo * 1000:.0f} ms | {t_orig / t_novo:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Compara o df_completo extraído pelo motor de texto com o do Camelot.
+
+Processa o mesmo PDF com motor="texto" e motor="camelot", mede o tempo de
+cada um e aponta, por página, as linhas que só aparecem em um dos motores.
+Os avisos da extração (ex.: Camelot ou Ghostscript ausentes) são listados
+no final. Sai com código 1 se os resultados forem diferentes.
+
+Uso (na raiz do projeto):
+    python benchmarks/compare_motores.py [--pdf "CONTRACHEQUES MAT. D.pdf"] [--linhas 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+import app4  # noqa: E402
+
+PDF_EXEMPLO = os.path.join(RAIZ, "CONTRACHEQUES MAT. D.pdf")
+MOTORES = ["texto", "camelot"]
+
+
+def extrair(dados, motor):
+    avisos = []
+    token = app4._avisos_extracao.set(avisos)
+    try:
+        inicio = time.perf_counter()
+        df = app4.processar_contracheque(dados, motor=motor)
+        duracao = time.perf_counter() - inicio
+    finally:
+        app4._avisos_extracao.reset(token)
+    return df, duracao, avisos
+
+
+def diferencas(df_texto, df_camelot):
+    """Linhas (com repetições) presentes em só um dos motores, com a origem."""
+    colunas = [c for c in app4.COLUNAS_COMPLETO if c in df_texto.columns and c in df_camelot.columns]
+    a = df_texto[colunas].astype(str)
+    b = df_camelot[colunas].astype(str)
+    # Numera as repetições para que linhas iguais na mesma página se pareiem uma a uma
+    a = a.assign(_n=a.groupby(colunas).cumcount())
+    b = b.assign(_n=b.groupby(colunas).cumcount())
+    juntas = a.merge(b, on=colunas + ["_n"], how="outer", indicator="origem")
+    juntas = juntas[juntas["origem"] != "both"].drop(columns="_n")
+    juntas["origem"] = juntas["origem"].map({"left_only": "texto", "right_only": "camelot"})
+    juntas["PAGINA"] = juntas["PAGINA"].astype(int)
+    return juntas.sort_values(["PAGINA", "origem"], kind="stable")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=PDF_EXEMPLO)
+    parser.add_argument("--linhas", type=int, default=20, help="Diferenças exibidas")
+    args = parser.parse_args()
+
+    with open(args.pdf, "rb") as f:
+        dados = f.read()
+    resultados = {}
+    for motor in MOTORES:
+        df, duracao, avisos = extrair(dados, motor)
+        resultados[motor] = df
+        print(f"{motor:8} {len(df):6} linhas  {df['PAGINA'].nunique() if len(df) else 0:4} páginas  "
+              f"{duracao * 1000:9.1f} ms")
+        for aviso in avisos:
+            print(f"  aviso ({motor}): {aviso['mensagem']}")
+
+    df_texto, df_camelot = resultados["texto"], resultados["camelot"]
+    try:
+        pd.testing.assert_frame_equal(df_texto, df_camelot, check_categorical=False)
+    except AssertionError as e:
+        difs = diferencas(df_texto, df_camelot)
+        print(f"Resultados diferentes: {len(difs)} linha(s) em só um dos motores")
+        if len(difs):
+            print(difs.head(args.linhas).to_string(index=False))
+        else:
+            # Mesmas linhas, em outra ordem ou com outros tipos
+            print(e)
+        sys.exit(1)
+    print("Resultados iguais")
+
+
+if __name__ == "__main__":
+    main()
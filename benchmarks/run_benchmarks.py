@@ -0,0 +1,266 @@
+"""
+Benchmarks do pipeline: extração, realinhamento, glossário e relatórios.
+
+Mede separadamente ler_tabelas, processar_contracheque,
+ajustar_descontos_por_pagina, cruzar_descontos_com_rubricas, salvar_em_pdf e
+df_to_docx_bytes sobre o PDF de exemplo e sobre PDFs sintéticos de 10, 100 e
+1000 páginas (as páginas do exemplo repetidas em ciclo). Cada medição roda
+num processo próprio, para que o pico de memória (RSS) seja só daquela
+etapa, e o resultado sai em JSON para comparar execuções entre mudanças.
+
+Uso (na raiz do projeto):
+    python benchmarks/run_benchmarks.py [--paginas 10,100,1000] [--motor texto]
+        [--casos ler_tabelas,salvar_em_pdf] [--repeticoes 1] [--saida resultado.json]
+"""
+import argparse
+import json
+import os
+import pickle
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PDF_EXEMPLO = os.path.join(RAIZ, "CONTRACHEQUES MAT. D.pdf")
+CASOS = [
+    "ler_tabelas",
+    "processar_contracheque",
+    "ajustar_descontos_por_pagina",
+    "cruzar_descontos_com_rubricas",
+    "salvar_em_pdf",
+    "df_to_docx_bytes",
+]
+
+
+###############################################################################
+# DOCUMENTOS
+###############################################################################
+def gerar_pdf_sintetico(destino, num_paginas, modelo=PDF_EXEMPLO):
+    """Grava um PDF com num_paginas repetindo em ciclo as páginas do modelo."""
+    from pypdf import PdfReader, PdfWriter
+    reader = PdfReader(modelo)
+    writer = PdfWriter()
+    for i in range(num_paginas):
+        writer.add_page(reader.pages[i % len(reader.pages)])
+    with open(destino, "wb") as f:
+        writer.write(f)
+    return destino
+
+
+###############################################################################
+# EXECUÇÃO DE UM CASO (no processo filho)
+###############################################################################
+def _pico_rss_mb():
+    # ru_maxrss vem em KiB no Linux; os filhos cobrem os workers do Camelot
+    pico = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(pico / 1024, 1)
+
+
+def _importar_app():
+    import logging
+    import warnings
+    warnings.filterwarnings("ignore")
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    sys.path.insert(0, RAIZ)
+    os.chdir(RAIZ)
+    import app4
+    return app4
+
+
+def preparar_entradas(documento, destino, opcoes):
+    """
+    Extrai o documento uma vez e grava as entradas das etapas seguintes:
+    o DataFrame que chega ao realinhamento (todas as páginas, antes de
+    realinhar), o completo e o de descontos.
+    """
+    app4 = _importar_app()
+    import pandas as pd
+    paginas = []
+    ajustar = app4.ajustar_descontos_por_pagina
+
+    def _capturar(df):
+        # O realinhamento é chamado uma vez por página
+        paginas.append(df.copy())
+        return ajustar(df)
+
+    app4.ajustar_descontos_por_pagina = _capturar
+    df_completo = app4.processar_contracheque(documento, **opcoes)
+    app4.ajustar_descontos_por_pagina = ajustar
+    entradas = {
+        "ajuste": pd.concat(paginas, ignore_index=True) if paginas else None,
+        "completo": df_completo,
+        "descontos": app4.filtrar_descontos(df_completo),
+    }
+    with open(destino, "wb") as f:
+        pickle.dump(entradas, f)
+
+
+def executar_caso(caso, documento, arquivo_entradas, opcoes):
+    """Roda um caso e devolve tempo, linhas e pico de memória."""
+    app4 = _importar_app()
+    entradas = {}
+    if arquivo_entradas:
+        with open(arquivo_entradas, "rb") as f:
+            entradas = pickle.load(f)
+
+    if caso == "ler_tabelas":
+        def etapa():
+            return app4.ler_tabelas(documento, **opcoes)
+
+        def contar(tabelas):
+            return sum(len(t.df) for t in tabelas)
+    elif caso == "processar_contracheque":
+        def etapa():
+            return app4.processar_contracheque(documento, **opcoes)
+        contar = len
+    elif caso == "ajustar_descontos_por_pagina":
+        df = entradas["ajuste"]
+
+        def etapa():
+            return app4.ajustar_descontos_por_pagina(df.copy())
+        contar = len
+    elif caso == "cruzar_descontos_com_rubricas":
+        df = entradas["descontos"]
+        glossario = app4.obter_glossario()
+
+        def etapa():
+            return app4.cruzar_descontos_com_rubricas(df, glossario, 85)
+
+        def contar(_):
+            return len(df)
+    elif caso == "salvar_em_pdf":
+        df = entradas["completo"]
+
+        def etapa():
+            return app4.salvar_em_pdf(df.copy(), "Benchmark", app4.COLUNAS_PDF_COMPLETO)
+
+        def contar(_):
+            return len(df)
+    elif caso == "df_to_docx_bytes":
+        df = entradas["completo"]
+
+        def etapa():
+            return app4.df_to_docx_bytes(df, "Benchmark")
+
+        def contar(_):
+            return len(df)
+    else:
+        raise ValueError(f"Caso desconhecido: {caso}")
+
+    inicio = time.perf_counter()
+    resultado = etapa()
+    tempo = time.perf_counter() - inicio
+    linhas = contar(resultado)
+    return {
+        "tempo_s": round(tempo, 4),
+        "linhas": linhas,
+        "linhas_por_s": round(linhas / tempo, 1) if tempo > 0 else None,
+        "pico_rss_mb": _pico_rss_mb(),
+    }
+
+
+###############################################################################
+# ORQUESTRAÇÃO (processo principal)
+###############################################################################
+def _rodar_filho(argumentos):
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__)] + argumentos,
+                          capture_output=True, text=True, cwd=RAIZ)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "falha no processo filho")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _num_paginas(documento):
+    from pypdf import PdfReader
+    return len(PdfReader(documento).pages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paginas", default="10,100,1000",
+                        help="Tamanhos dos PDFs sintéticos, separados por vírgula (vazio = só o exemplo)")
+    parser.add_argument("--casos", default=",".join(CASOS), help="Etapas a medir, separadas por vírgula")
+    parser.add_argument("--motor", choices=["camelot", "texto"], default=None, help="Motor de extração")
+    parser.add_argument("--repeticoes", type=int, default=1, help="Execuções por caso (vale a mais rápida)")
+    parser.add_argument("--saida", default=None, help="Arquivo JSON de saída (padrão: só imprime)")
+    # Uso interno: execução de um caso no processo filho
+    parser.add_argument("--executar", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--documento", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--entradas", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    opcoes = {"motor": args.motor} if args.motor else {}
+    if args.executar == "preparar":
+        preparar_entradas(args.documento, args.entradas, opcoes)
+        print(json.dumps({"ok": True}))
+        return
+    if args.executar:
+        print(json.dumps(executar_caso(args.executar, args.documento, args.entradas, opcoes)))
+        return
+
+    casos = [c for c in args.casos.split(",") if c]
+    desconhecidos = set(casos) - set(CASOS)
+    if desconhecidos:
+        parser.error(f"Casos desconhecidos: {sorted(desconhecidos)}")
+    tamanhos = [int(p) for p in args.paginas.split(",") if p.strip()]
+    extra = ["--motor", args.motor] if args.motor else []
+
+    resultados = []
+    inicio = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        documentos = [("exemplo", PDF_EXEMPLO)]
+        for n in tamanhos:
+            documentos.append((f"sintetico_{n}", gerar_pdf_sintetico(os.path.join(tmp, f"sintetico_{n}.pdf"), n)))
+
+        for nome, documento in documentos:
+            paginas = _num_paginas(documento)
+            entradas = os.path.join(tmp, f"{nome}.pkl")
+            try:
+                _rodar_filho(["--executar", "preparar", "--documento", documento, "--entradas", entradas] + extra)
+            except RuntimeError as e:
+                print(f"{nome}: não foi possível preparar as entradas ({e})", file=sys.stderr)
+                continue
+            for caso in casos:
+                medicoes = []
+                erro = None
+                for _ in range(max(1, args.repeticoes)):
+                    try:
+                        medicoes.append(_rodar_filho(["--executar", caso, "--documento", documento,
+                                                      "--entradas", entradas] + extra))
+                    except RuntimeError as e:
+                        erro = str(e)
+                        break
+                registro = {"documento": nome, "paginas": paginas, "caso": caso}
+                if medicoes:
+                    registro.update(min(medicoes, key=lambda m: m["tempo_s"]))
+                    registro["repeticoes"] = len(medicoes)
+                if erro:
+                    registro["erro"] = erro
+                resultados.append(registro)
+                print(f"{nome:>16} {caso:<30} "
+                      + (f"{registro['tempo_s']:9.3f}s {registro['pico_rss_mb']:8.1f} MB "
+                         f"{registro['linhas_por_s'] or 0:12.1f} linhas/s" if medicoes else f"erro: {erro}"),
+                      file=sys.stderr)
+
+    relatorio = {
+        "gerado_em": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "motor": args.motor or "padrão",
+        "tempo_total_s": round(time.perf_counter() - inicio, 3),
+        "resultados": resultados,
+    }
+    texto = json.dumps(relatorio, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto)
+    print(texto)
+
+
+if __name__ == "__main__":
+    main()
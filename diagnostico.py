@@ -0,0 +1,137 @@
+"""
+Instrumentação leve das etapas do pipeline.
+
+medir_etapa registra duração e contagens (linhas, páginas...) de um trecho
+de código. Os registros vão para o coletor da execução corrente (aberto com
+coletar_medicoes, um por rerun do Streamlit ou por arquivo do lote) e para
+o logger "contracheque.etapas" como JSON, uma linha por etapa. Fora de um
+coletor, e sem logging configurado, o custo é só o de dois perf_counter.
+
+perfilar captura, sob demanda, um perfil de cProfile ou pyinstrument.
+Este módulo não importa o Streamlit.
+"""
+import contextlib
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import time
+
+import pandas as pd
+
+logger = logging.getLogger("contracheque.etapas")
+
+# CONTRACHEQUE_LOG_ETAPAS=1 escreve os registros em stderr sem exigir
+# configuração de logging na aplicação
+if os.environ.get("CONTRACHEQUE_LOG_ETAPAS", "0") == "1" and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+_coletor = contextvars.ContextVar("coletor_etapas", default=None)
+
+
+###############################################################################
+# MEDIÇÃO E COLETA
+###############################################################################
+@contextlib.contextmanager
+def medir_etapa(nome, **detalhes):
+    """
+    Mede o bloco e devolve o registro da etapa, que o chamador pode
+    completar (ex.: registro["linhas"] = len(df)) antes de sair do bloco.
+    """
+    registro = {"etapa": nome, **detalhes}
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    except Exception as e:
+        registro["erro"] = type(e).__name__
+        raise
+    finally:
+        registro["duracao_ms"] = round((time.perf_counter() - inicio) * 1000, 3)
+        coletor = _coletor.get()
+        if coletor is not None:
+            coletor.append(registro)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(registro, ensure_ascii=False, default=str))
+
+
+@contextlib.contextmanager
+def coletar_medicoes():
+    """Coleta, numa lista, os registros de medir_etapa feitos dentro do bloco."""
+    registros = []
+    token = _coletor.set(registros)
+    try:
+        yield registros
+    finally:
+        _coletor.reset(token)
+
+
+def registrar_medicoes(registros):
+    """Acrescenta ao coletor corrente registros medidos em outro contexto (ex.: numa tarefa da fila)."""
+    coletor = _coletor.get()
+    if coletor is not None:
+        coletor.extend(registros)
+
+
+def resumir_medicoes(registros):
+    """Totais por etapa: chamadas, tempo total/máximo e soma das linhas."""
+    colunas = ["etapa", "chamadas", "total_ms", "max_ms", "linhas"]
+    if not registros:
+        return pd.DataFrame(columns=colunas)
+    df = pd.DataFrame(registros)
+    if "linhas" not in df.columns:
+        df["linhas"] = pd.NA
+    resumo = df.groupby("etapa", sort=False).agg(
+        chamadas=("duracao_ms", "size"),
+        total_ms=("duracao_ms", "sum"),
+        max_ms=("duracao_ms", "max"),
+        linhas=("linhas", lambda s: s.sum(min_count=1)),
+    ).reset_index()
+    resumo["total_ms"] = resumo["total_ms"].round(3)
+    resumo["linhas"] = resumo["linhas"].astype("Int64")
+    return resumo.sort_values("total_ms", ascending=False, ignore_index=True)[colunas]
+
+
+###############################################################################
+# PERFIL SOB DEMANDA
+###############################################################################
+PERFILADORES = ["cprofile", "pyinstrument"]
+
+
+@contextlib.contextmanager
+def perfilar(modo="cprofile", limite=40):
+    """
+    Perfila o bloco. O dicionário devolvido recebe, na saída, "relatorio"
+    (texto) e "modo" efetivo; sem o pyinstrument instalado, usa o cProfile
+    e registra o motivo em "aviso".
+    """
+    resultado = {"modo": modo, "relatorio": "", "aviso": None}
+    if modo == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            resultado["modo"] = modo = "cprofile"
+            resultado["aviso"] = "pyinstrument não está instalado; usando cProfile."
+    if modo == "pyinstrument":
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield resultado
+        finally:
+            profiler.stop()
+            resultado["relatorio"] = profiler.output_text(unicode=True)
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield resultado
+    finally:
+        profiler.disable()
+        saida = io.StringIO()
+        pstats.Stats(profiler, stream=saida).sort_stats("cumulative").print_stats(limite)
+        resultado["relatorio"] = saida.getvalue()
@@ -0,0 +1,363 @@
+"""
+Tarefas de extração de tabelas executadas em processos separados.
+
+Ficam fora de app4.py porque o Streamlit executa o script como um módulo
+"__main__" próprio, cujas funções não podem ser enviadas com segurança para
+um ProcessPoolExecutor. Este módulo não importa o Streamlit.
+"""
+import hashlib
+import re
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from diagnostico import medir_etapa
+
+###############################################################################
+# REPRESENTAÇÃO LEVE DE UMA TABELA (compatível com camelot.core.Table)
+###############################################################################
+# Mesmos atributos usados em processar_contracheque (table.page e table.df),
+# mas serializável entre processos sem carregar o objeto completo do Camelot.
+TabelaExtraida = namedtuple("TabelaExtraida", ["page", "df"])
+
+
+def dividir_em_blocos(num_paginas, paginas_por_bloco, ignorar=()):
+    """
+    Divide 1..num_paginas, menos as páginas em ignorar, em blocos no formato
+    aceito pelo Camelot ("1-4", ou "1,2,4" quando o bloco tem lacunas).
+    """
+    paginas = [p for p in range(1, num_paginas + 1) if p not in ignorar]
+    blocos = []
+    for i in range(0, len(paginas), paginas_por_bloco):
+        bloco = paginas[i:i + paginas_por_bloco]
+        if len(bloco) > 1 and bloco[-1] - bloco[0] == len(bloco) - 1:
+            blocos.append(f"{bloco[0]}-{bloco[-1]}")
+        else:
+            blocos.append(",".join(str(p) for p in bloco))
+    return blocos
+
+
+def expandir_paginas(paginas):
+    """Converte "1-3,5" em [1, 2, 3, 5]."""
+    numeros = []
+    for parte in str(paginas).split(","):
+        if "-" in parte:
+            inicio, fim = parte.split("-")
+            numeros.extend(range(int(inicio), int(fim) + 1))
+        elif parte.strip():
+            numeros.append(int(parte))
+    return numeros
+
+
+def encontrar_cabecalho(df):
+    for idx, row in df.iterrows():
+        if row.astype(str).str.contains(r"des[çc]rição", case=False, regex=True).any():
+            return idx
+    return None
+
+
+###############################################################################
+# TAREFA: LER UM BLOCO DE PÁGINAS COM O CAMELOT
+###############################################################################
+def ler_paginas_camelot(pdf_path, paginas, fallback_stream=True):
+    """
+    Lê as páginas com flavor="lattice" e, apenas nas páginas em que nenhuma
+    tabela tem o cabeçalho "DESCRIÇÃO", tenta novamente com flavor="stream".
+    As tabelas são devolvidas ordenadas por página.
+    """
+    import camelot
+    with medir_etapa("camelot_lattice", paginas=paginas) as etapa:
+        tables = camelot.read_pdf(
+            pdf_path,
+            pages=paginas,
+            flavor="lattice",
+            strip_text=''
+        )
+        tabelas = [TabelaExtraida(int(t.page), t.df) for t in tables]
+        etapa["tabelas"] = len(tabelas)
+    if fallback_stream:
+        paginas_ok = {t.page for t in tabelas if encontrar_cabecalho(t.df) is not None}
+        faltantes = [p for p in expandir_paginas(paginas) if p not in paginas_ok]
+        if faltantes:
+            with medir_etapa("camelot_stream", paginas=len(faltantes)) as etapa:
+                tables_stream = camelot.read_pdf(
+                    pdf_path,
+                    pages=",".join(str(p) for p in faltantes),
+                    flavor="stream",
+                    strip_text=''
+                )
+                etapa["tabelas"] = tables_stream.n
+            tabelas.extend(TabelaExtraida(int(t.page), t.df) for t in tables_stream)
+            tabelas.sort(key=lambda t: t.page)
+    return tabelas
+
+
+###############################################################################
+# MOTOR DE TEXTO: LÊ AS COORDENADAS DAS PALAVRAS (sem Ghostscript/OpenCV)
+###############################################################################
+# O contracheque da SEAD tem layout fixo: COD, DESCRIÇÃO, PARC, INF., BASE,
+# GANHOS e DESCONTOS. As faixas de x de cada coluna são calibradas pelas
+# células do cabeçalho e cada palavra do corpo vai para a faixa que contém
+# o seu centro. O resultado tem o mesmo formato de table.df do Camelot
+# (cabeçalho na linha 0 e 7 colunas), para seguir o mesmo pós-processamento.
+# Palavras e retângulos são dicionários com x0, x1, top e bottom (origem no
+# canto superior esquerdo, como no pdfplumber).
+TOLERANCIA_LINHA = 2.0  # pontos: palavras com "top" próximo formam a mesma linha
+
+
+def _agrupar_linhas(palavras):
+    linhas = []
+    for palavra in sorted(palavras, key=lambda p: (p["top"], p["x0"])):
+        if linhas and abs(palavra["top"] - linhas[-1][0]["top"]) <= TOLERANCIA_LINHA:
+            linhas[-1].append(palavra)
+        else:
+            linhas.append([palavra])
+    return [sorted(linha, key=lambda p: p["x0"]) for linha in linhas]
+
+
+def _eh_linha_cabecalho(linha):
+    textos = [p["text"].upper() for p in linha]
+    return (any(re.match(r"DES[CÇ]RI[CÇ][AÃ]O", t) for t in textos)
+            and "GANHOS" in textos and "DESCONTOS" in textos)
+
+
+def _faixas_do_cabecalho(linha_cabecalho, retangulos):
+    """
+    Retorna (faixas, fundo_do_corpo): as faixas [x0, x1] das células do
+    cabeçalho (a menor célula que contém cada palavra do cabeçalho) e o limite
+    inferior do corpo da tabela, ou (None, None) se não houver a grade esperada.
+    """
+    celulas = []
+    for palavra in linha_cabecalho:
+        cx = (palavra["x0"] + palavra["x1"]) / 2
+        cy = (palavra["top"] + palavra["bottom"]) / 2
+        candidatas = [r for r in retangulos
+                      if r["x0"] <= cx <= r["x1"] and r["top"] <= cy <= r["bottom"]]
+        if candidatas:
+            menor = min(candidatas, key=lambda r: r["x1"] - r["x0"])
+            if menor not in celulas:
+                celulas.append(menor)
+    if len(celulas) < 7:
+        return None, None
+    celulas.sort(key=lambda r: r["x0"])
+    faixas = [(r["x0"], r["x1"]) for r in celulas]
+    fundo = None
+    for r in retangulos:
+        if abs(r["top"] - celulas[0]["bottom"]) <= 2 and abs(r["x0"] - celulas[0]["x0"]) <= 2:
+            fundo = max(fundo or 0, r["bottom"])
+    return faixas, fundo
+
+
+def _distribuir_em_faixas(linha, faixas):
+    colunas = [[] for _ in faixas]
+    for palavra in linha:
+        centro = (palavra["x0"] + palavra["x1"]) / 2
+        for i, (x0, x1) in enumerate(faixas):
+            if x0 <= centro <= x1:
+                colunas[i].append(palavra["text"])
+                break
+    return [" ".join(textos) for textos in colunas]
+
+
+def extrair_tabela_texto(palavras, retangulos):
+    """
+    Monta a tabela de uma página a partir das palavras e dos retângulos da
+    grade. Retorna None quando a página não tem cabeçalho ou grade
+    reconhecível (o chamador recorre ao Camelot).
+    """
+    linhas = _agrupar_linhas(palavras)
+    for i, linha in enumerate(linhas):
+        if _eh_linha_cabecalho(linha):
+            faixas, fundo = _faixas_do_cabecalho(linha, retangulos)
+            if faixas is None:
+                return None
+            registros = [_distribuir_em_faixas(linha, faixas)]
+            for corpo in linhas[i + 1:]:
+                if fundo is not None and corpo[0]["top"] >= fundo:
+                    break
+                if fundo is None and corpo[0]["text"].upper() == "TOTAL":
+                    break
+                registros.append(_distribuir_em_faixas(corpo, faixas))
+            return pd.DataFrame(registros)
+    return None
+
+
+def _palavras_e_retangulos(pagina):
+    """
+    Lê palavras (a partir dos caracteres), retângulos e o texto da página
+    com o pdfium. Retorna (palavras, retangulos, texto).
+    """
+    import pypdfium2.raw as pdfium_c
+    altura = pagina.get_height()
+    textpage = pagina.get_textpage()
+    try:
+        n = textpage.count_chars()
+        texto = textpage.get_text_range(0, n) if n else ""
+        palavras = []
+        atual = None
+        for j, ch in enumerate(texto[:n]):
+            if ch.isspace():
+                atual = None
+                continue
+            esq, base, dir_, topo = textpage.get_charbox(j, loose=True)
+            caixa = {"x0": esq, "x1": dir_, "top": altura - topo, "bottom": altura - base}
+            if (atual is not None and abs(caixa["top"] - atual["top"]) <= TOLERANCIA_LINHA
+                    and caixa["x0"] - atual["x1"] <= 1.0):
+                atual["text"] += ch
+                atual["x1"] = max(atual["x1"], caixa["x1"])
+                atual["bottom"] = max(atual["bottom"], caixa["bottom"])
+            else:
+                atual = dict(caixa, text=ch)
+                palavras.append(atual)
+    finally:
+        textpage.close()
+    retangulos = []
+    for obj in pagina.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_PATH]):
+        esq, base, dir_, topo = obj.get_bounds()
+        retangulos.append({"x0": esq, "x1": dir_, "top": altura - topo, "bottom": altura - base})
+    return palavras, retangulos, texto
+
+
+def iterar_paginas_texto(origem, paginas=None):
+    """
+    Lê as tabelas pela camada de texto, uma página por vez. origem pode ser
+    caminho ou bytes. Gera (numero_da_pagina, df, texto), com df None quando
+    a página não tem tabela reconhecível; texto é o da página inteira, lido
+    junto com as palavras.
+    """
+    import pypdfium2 as pdfium
+    pdf = pdfium.PdfDocument(origem)
+    try:
+        numeros = expandir_paginas(paginas) if paginas else range(1, len(pdf) + 1)
+        for numero in numeros:
+            pagina = pdf[numero - 1]
+            try:
+                with medir_etapa("detectar_tabela_pagina", pagina=numero) as etapa:
+                    palavras, retangulos, texto = _palavras_e_retangulos(pagina)
+                    df = extrair_tabela_texto(palavras, retangulos)
+                    etapa["linhas"] = 0 if df is None else len(df)
+            finally:
+                pagina.close()
+            yield numero, df, texto
+    finally:
+        pdf.close()
+
+
+###############################################################################
+# OCR: PÁGINAS SEM CAMADA DE TEXTO (contracheques digitalizados)
+###############################################################################
+# Só as páginas sem nenhum caractere na camada de texto passam pelo OCR. A
+# página é rasterizada com o pdfium no DPI pedido, o Tesseract devolve as
+# palavras com as caixas em pixels e as linhas da grade são detectadas com
+# OpenCV. Tudo é convertido para pontos e segue para extrair_tabela_texto,
+# com as mesmas faixas de colunas do motor de texto.
+def mapear_paginas_sem_texto(origem):
+    """
+    Retorna {numero_da_pagina: hash} das páginas sem camada de texto que
+    têm alguma imagem. O hash cobre os dados e a posição das imagens e o
+    tamanho da página, e identifica a página para o cache de OCR.
+    """
+    import pypdfium2 as pdfium
+    import pypdfium2.raw as pdfium_c
+    pdf = pdfium.PdfDocument(origem)
+    paginas = {}
+    try:
+        for i in range(len(pdf)):
+            pagina = pdf[i]
+            try:
+                textpage = pagina.get_textpage()
+                try:
+                    tem_texto = textpage.count_chars() > 0
+                finally:
+                    textpage.close()
+                if tem_texto:
+                    continue
+                h = hashlib.sha256(repr((pagina.get_size(), pagina.get_rotation())).encode())
+                imagens = 0
+                for imagem in pagina.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_IMAGE]):
+                    h.update(bytes(imagem.get_data(decode_simple=False)))
+                    h.update(repr(imagem.get_matrix().get()).encode())
+                    imagens += 1
+                if imagens:
+                    paginas[i + 1] = h.hexdigest()
+            finally:
+                pagina.close()
+    finally:
+        pdf.close()
+    return paginas
+
+
+def _retangulos_da_grade(imagem, escala):
+    """Células delimitadas pelas linhas da grade na imagem (em pontos)."""
+    import cv2
+    _, binaria = cv2.threshold(imagem, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    altura, largura = binaria.shape
+    horizontais = cv2.morphologyEx(binaria, cv2.MORPH_OPEN,
+                                   cv2.getStructuringElement(cv2.MORPH_RECT, (max(largura // 40, 1), 1)))
+    verticais = cv2.morphologyEx(binaria, cv2.MORPH_OPEN,
+                                 cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(altura // 80, 1))))
+    grade = cv2.dilate(cv2.bitwise_or(horizontais, verticais), np.ones((3, 3), np.uint8))
+    contornos, _ = cv2.findContours(cv2.bitwise_not(grade), cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    retangulos = []
+    for contorno in contornos:
+        x, y, w, h = cv2.boundingRect(contorno)
+        if w < 4 or h < 4 or (w >= largura - 4 and h >= altura - 4):
+            continue
+        retangulos.append({"x0": x / escala, "x1": (x + w) / escala,
+                           "top": y / escala, "bottom": (y + h) / escala})
+    return retangulos
+
+
+def _palavras_ocr(imagem, escala, idioma):
+    """
+    Palavras reconhecidas pelo Tesseract (em pontos) e o texto da página.
+    As palavras da mesma linha do Tesseract recebem o mesmo "top", para que
+    letras de alturas diferentes não quebrem a linha em _agrupar_linhas.
+    """
+    import pytesseract
+    dados = pytesseract.image_to_data(imagem, lang=idioma, config="--psm 6",
+                                      output_type=pytesseract.Output.DICT)
+    linhas = {}
+    for i, texto in enumerate(dados["text"]):
+        texto = texto.strip()
+        if not texto:
+            continue
+        x, y, w, h = (dados[k][i] for k in ("left", "top", "width", "height"))
+        chave = (dados["block_num"][i], dados["par_num"][i], dados["line_num"][i])
+        linhas.setdefault(chave, []).append({"text": texto, "x0": x / escala, "x1": (x + w) / escala,
+                                             "top": y / escala, "bottom": (y + h) / escala})
+    palavras = []
+    for linha in linhas.values():
+        topo = min(p["top"] for p in linha)
+        for p in linha:
+            p["top"] = topo
+        palavras.extend(linha)
+    texto = "\n".join(" ".join(p["text"] for p in linha) for linha in linhas.values())
+    return palavras, texto
+
+
+def ler_pagina_ocr(origem, numero, dpi=300, idioma="por"):
+    """
+    Lê por OCR a tabela de uma página (1-based). origem pode ser caminho ou
+    bytes. Retorna (df, texto), com df None se a tabela não for reconhecida;
+    o texto serve para a competência, o nome e a matrícula.
+    """
+    import pypdfium2 as pdfium
+    escala = dpi / 72
+    with medir_etapa("ocr", pagina=numero, dpi=dpi) as etapa:
+        pdf = pdfium.PdfDocument(origem)
+        try:
+            pagina = pdf[numero - 1]
+            try:
+                imagem = pagina.render(scale=escala, grayscale=True).to_numpy()
+            finally:
+                pagina.close()
+        finally:
+            pdf.close()
+        if imagem.ndim == 3:
+            imagem = imagem[:, :, 0]
+        palavras, texto = _palavras_ocr(imagem, escala, idioma)
+        df = extrair_tabela_texto(palavras, _retangulos_da_grade(imagem, escala))
+        etapa["linhas"] = 0 if df is None else len(df)
+    return df, texto
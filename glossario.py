@@ -0,0 +1,174 @@
+"""
+Glossário de rubricas compilado para o cruzamento com os descontos.
+
+As linhas de Rubricas.txt são normalizadas (sem acentos, maiúsculas e
+espaços simples) e as variantes repetidas ("OLÉ CARTÃO" / "OLE CARTAO")
+viram um único termo. Cada descrição é resolvida primeiro por igualdade
+(dicionário de termos) e, se cortada na largura da coluna do contracheque,
+pelo prefixo de um termo mais longo; só as que sobram são pontuadas com
+fuzz.ratio contra todos os termos.
+
+ServicoGlossarios mantém os glossários disponíveis (o principal e os de
+uma pasta, por banco ou categoria) compilados e os recompila quando o
+arquivo muda.
+Este módulo não importa o Streamlit.
+"""
+import glob
+import hashlib
+import os
+import threading
+import time
+import unicodedata
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+# O contracheque SEAD corta a DESCRIÇÃO em 20 caracteres
+LARGURA_DESCRICAO = 20
+
+
+def normalizar_rubrica(texto):
+    """Sem acentos, em maiúsculas e com espaços simples ("Olé  cartão" -> "OLE CARTAO")."""
+    texto = str(texto)
+    if not texto.isascii():
+        decomposto = unicodedata.normalize("NFKD", texto)
+        texto = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return " ".join(texto.upper().split())
+
+
+class GlossarioCompilado:
+    """
+    Termos normalizados e sem repetição, com índice exato e de prefixos.
+    linhas são as linhas não vazias do arquivo, originais[i] é a primeira
+    grafia do termo i e versao identifica o conteúdo (serve de chave para
+    caches de pontuação).
+    """
+
+    def __init__(self, linhas):
+        self.linhas = [linha.strip() for linha in linhas if linha.strip()]
+        self.termos = []
+        self.originais = []
+        self.exatos = {}
+        self.prefixos = {}
+        for linha in linhas:
+            termo = normalizar_rubrica(linha)
+            if not termo or termo in self.exatos:
+                continue
+            self.exatos[termo] = len(self.termos)
+            self.termos.append(termo)
+            self.originais.append(linha.strip())
+        # Prefixos só depois dos termos exatos, que têm precedência
+        for i, termo in enumerate(self.termos):
+            if len(termo) > LARGURA_DESCRICAO:
+                self.prefixos.setdefault(termo[:LARGURA_DESCRICAO].rstrip(), i)
+        self.versao = hashlib.sha256("\n".join(self.termos).encode("utf-8")).hexdigest()[:12]
+
+    def __len__(self):
+        return len(self.termos)
+
+    def __bool__(self):
+        return bool(self.termos)
+
+    def resolver(self, descricao_normalizada):
+        """Índice do termo igual à descrição (ou do qual ela é o corte), ou None."""
+        i = self.exatos.get(descricao_normalizada)
+        if i is None and len(descricao_normalizada) >= LARGURA_DESCRICAO - 1:
+            i = self.prefixos.get(descricao_normalizada)
+        return i
+
+    def pontuar(self, descricoes, workers=-1):
+        """
+        Maior pontuação (0 a 100) e índice do termo correspondente para cada
+        descrição. Resolvidas pelo índice valem 100; as demais passam pelo
+        process.cdist, uma vez por descrição normalizada distinta.
+        """
+        normalizadas = [normalizar_rubrica(d) for d in descricoes]
+        resolvidos = [self.resolver(d) for d in normalizadas]
+        pontuacoes = np.full(len(normalizadas), 100.0)
+        indices = np.array([-1 if i is None else i for i in resolvidos], dtype=np.intp)
+        pendentes = np.flatnonzero(indices < 0)
+        if len(pendentes) and self.termos:
+            distintas = {}
+            codigos = [distintas.setdefault(normalizadas[p], len(distintas)) for p in pendentes]
+            matriz = process.cdist(list(distintas), self.termos, scorer=fuzz.ratio,
+                                   dtype=np.float64, workers=workers)
+            melhores = matriz.argmax(axis=1)
+            pontuacoes[pendentes] = matriz[np.arange(len(distintas)), melhores][codigos]
+            indices[pendentes] = melhores[codigos]
+        elif len(pendentes):
+            pontuacoes[pendentes] = 0.0
+            indices[pendentes] = 0
+        return pontuacoes, indices
+
+
+###############################################################################
+# SERVIÇO DE GLOSSÁRIOS (recarga pelo mtime, sem reiniciar o app)
+###############################################################################
+def ler_linhas(caminho):
+    with open(caminho, "r", encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+class ServicoGlossarios:
+    """
+    Glossários disponíveis por nome: o arquivo principal e os *.txt do
+    diretório. Cada um é compilado uma vez; no acesso, o mtime do arquivo é
+    conferido (no máximo a cada intervalo segundos) e, se mudou, a versão
+    nova é compilada e substitui a anterior de uma vez. Quem já tinha a
+    versão anterior continua com ela; se a releitura falhar, ela é mantida.
+    """
+
+    def __init__(self, arquivo_principal, diretorio=None, intervalo=2.0):
+        self.arquivo_principal = arquivo_principal
+        self.diretorio = diretorio or None
+        self.intervalo = intervalo
+        self._compilados = {}  # caminho -> (mtime, GlossarioCompilado)
+        self._conferido_em = {}  # caminho -> time.monotonic()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _nome(caminho):
+        return os.path.splitext(os.path.basename(caminho))[0]
+
+    @property
+    def principal(self):
+        return self._nome(self.arquivo_principal)
+
+    def disponiveis(self):
+        """{nome: caminho}, com o principal primeiro."""
+        caminhos = [self.arquivo_principal]
+        if self.diretorio:
+            caminhos += sorted(glob.glob(os.path.join(self.diretorio, "*.txt")))
+        nomes = {}
+        for caminho in caminhos:
+            if os.path.isfile(caminho):
+                nomes.setdefault(self._nome(caminho), caminho)
+        return nomes
+
+    def obter(self, nome=None):
+        """GlossarioCompilado atual do glossário (o principal, se nome for None)."""
+        nome = nome or self.principal
+        caminho = self.disponiveis().get(nome)
+        if caminho is None:
+            raise FileNotFoundError(f"Glossário não encontrado: {nome}")
+        agora = time.monotonic()
+        with self._lock:
+            atual = self._compilados.get(caminho)
+            if atual is not None and agora - self._conferido_em[caminho] < self.intervalo:
+                return atual[1]
+            self._conferido_em[caminho] = agora
+        mtime = os.stat(caminho).st_mtime_ns
+        if atual is not None and atual[0] == mtime:
+            return atual[1]
+        try:
+            novo = (mtime, GlossarioCompilado(ler_linhas(caminho)))
+        except OSError:
+            if atual is not None:
+                return atual[1]
+            raise
+        with self._lock:
+            # Outra thread pode ter compilado uma versão mais nova nesse meio tempo
+            vigente = self._compilados.get(caminho)
+            if vigente is None or vigente[0] <= mtime:
+                self._compilados[caminho] = vigente = novo
+        return vigente[1]
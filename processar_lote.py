@@ -0,0 +1,177 @@
+"""
+Processamento em lote (sem interface) de contracheques SEAD.
+
+Para cada PDF encontrado, gera na pasta de saída os mesmos relatórios do app:
+completo, descontos, descontos x glossário e descontos finais (PDF e DOCX),
+além de um manifesto.json com tempos e erros por arquivo. As extrações
+também vão para o armazém SQLite do app (CONTRACHEQUE_ARMAZEM).
+
+Uso:
+    python processar_lote.py PASTA_OU_GLOB [...] --saida relatorios --workers 4
+"""
+import argparse
+import glob
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import app4
+from diagnostico import coletar_medicoes, resumir_medicoes
+from glossario import GlossarioCompilado, ler_linhas
+
+# O glossário padrão é o que acompanha o app, qualquer que seja a pasta corrente
+GLOSSARIO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), app4.GLOSSARY_PATH)
+
+
+def listar_pdfs(entradas):
+    arquivos = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            padrao = os.path.join(entrada, "**", "*.pdf")
+            arquivos.extend(glob.glob(padrao, recursive=True))
+        else:
+            arquivos.extend(glob.glob(entrada, recursive=True))
+    # Sem duplicatas e em ordem estável
+    return sorted(set(os.path.abspath(a) for a in arquivos if a.lower().endswith(".pdf")))
+
+
+def _gravar(pasta, nome_arquivo, dados):
+    caminho = os.path.join(pasta, nome_arquivo)
+    with open(caminho, "wb") as f:
+        f.write(dados)
+    return caminho
+
+
+def processar_arquivo(caminho_pdf, pasta_saida, glossario, limiar=85, valor_recebido="0", motor=None):
+    """Processa um PDF e grava seus relatórios. Retorna a entrada do manifesto."""
+    registro = {"arquivo": caminho_pdf, "status": "ok", "erro": None, "saidas": [], "tempos": {}}
+    inicio = time.perf_counter()
+    with coletar_medicoes() as medicoes:
+        _processar_arquivo(registro, caminho_pdf, pasta_saida, glossario, limiar, valor_recebido, motor)
+    registro["tempos"]["total"] = round(time.perf_counter() - inicio, 3)
+    resumo = resumir_medicoes(medicoes).astype(object)
+    registro["etapas"] = resumo.where(resumo.notna(), None).to_dict("records")
+    return registro
+
+
+def _processar_arquivo(registro, caminho_pdf, pasta_saida, glossario, limiar, valor_recebido, motor):
+    try:
+        with open(caminho_pdf, "rb") as f:
+            pdf_bytes = f.read()
+
+        t = time.perf_counter()
+        opcoes = {"paralelo": False}  # o paralelismo do lote é por arquivo
+        if motor:
+            opcoes["motor"] = motor
+        armazem = app4.ArmazemExtracoes(app4.ARMAZEM_PATH) if app4.ARMAZEM_PATH else None
+        resultado = app4.extrair_documento(pdf_bytes, cache=app4.CacheExtracoes(diretorio=app4.CACHE_DIR),
+                                           armazem=armazem, arquivo=os.path.basename(caminho_pdf), **opcoes)
+        registro["tempos"]["extracao"] = round(time.perf_counter() - t, 3)
+
+        df_completo = resultado["df"]
+        nome, matricula = resultado["nome"], resultado["matricula"]
+        registro.update({"nome": nome, "matricula": matricula, "linhas": len(df_completo)})
+        if df_completo.empty:
+            raise ValueError("Não foi possível extrair as informações do PDF ou o arquivo está vazio.")
+
+        base = os.path.splitext(os.path.basename(caminho_pdf))[0]
+        pasta = os.path.join(pasta_saida, app4.sanitizar_para_arquivo(base))
+        os.makedirs(pasta, exist_ok=True)
+        sufixo = f"{app4.sanitizar_para_arquivo(nome or 'ND')}_{app4.sanitizar_para_arquivo(matricula or 'ND')}"
+
+        t = time.perf_counter()
+        df_descontos = app4.filtrar_descontos(df_completo)
+        df_gloss = app4.cruzar_descontos_com_rubricas(df_descontos, glossario, limiar)
+        registro["tempos"]["glossario"] = round(time.perf_counter() - t, 3)
+        registro.update({"descontos": len(df_descontos), "descontos_glossario": len(df_gloss)})
+
+        t = time.perf_counter()
+        saidas = registro["saidas"]
+        saidas.append(_gravar(pasta, f"contracheque_completo_{sufixo}.pdf", app4.salvar_em_pdf(
+            dados=df_completo,
+            titulo_pdf=f"Relatório de Contracheque (Completo) - {nome} / {matricula}",
+            colunas_def=app4.COLUNAS_PDF_COMPLETO,
+        )))
+        if not df_descontos.empty:
+            saidas.append(_gravar(pasta, f"contracheque_descontos_{sufixo}.pdf", app4.salvar_em_pdf(
+                dados=df_descontos,
+                titulo_pdf=f"Contracheque - Descontos - {nome} / {matricula}",
+                colunas_def=app4.COLUNAS_PDF_DESCONTOS,
+            )))
+        if not df_gloss.empty:
+            saidas.append(_gravar(pasta, f"contracheque_descontos_glossario_{sufixo}.pdf", app4.salvar_em_pdf(
+                dados=df_gloss,
+                titulo_pdf=f"Descontos x Glossário - {nome} / {matricula}",
+                colunas_def=app4.COLUNAS_PDF_DESCONTOS,
+            )))
+            # No lote, todas as rubricas encontradas no glossário entram no relatório final
+            df_final = app4.montar_descontos_finais(df_gloss)
+            pdf_final, docx_final = app4.gerar_relatorio_final(
+                df_final, f"Descontos Finais (Cronológico) - {nome} / {matricula}", valor_recebido)
+            saidas.append(_gravar(pasta, f"contracheque_descontos_finais_{sufixo}.pdf", pdf_final))
+            saidas.append(_gravar(pasta, f"contracheque_descontos_finais_{sufixo}.docx", docx_final))
+        registro["tempos"]["relatorios"] = round(time.perf_counter() - t, 3)
+    except Exception as e:
+        registro["status"] = "erro"
+        registro["erro"] = f"{type(e).__name__}: {e}"
+        registro["traceback"] = traceback.format_exc()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("entradas", nargs="+", help="Pastas ou padrões glob de arquivos PDF")
+    parser.add_argument("--saida", default="relatorios", help="Pasta onde os relatórios serão gravados")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Arquivos processados em paralelo")
+    parser.add_argument("--glossario", default=GLOSSARIO_PADRAO, help="Arquivo de rubricas")
+    parser.add_argument("--limiar", type=float, default=0.85, help="Nível de similaridade (0.1 a 1.0)")
+    parser.add_argument("--valor-recebido", default="0", help="Valor B (Valor Recebido - Autor (a))")
+    parser.add_argument("--motor", choices=["camelot", "texto"], default=None, help="Motor de extração")
+    args = parser.parse_args()
+
+    arquivos = listar_pdfs(args.entradas)
+    if not arquivos:
+        parser.error("Nenhum arquivo PDF encontrado.")
+    # Sem glossário, os relatórios de descontos x glossário e finais não
+    # seriam gerados: falha aqui em vez de marcar todos os arquivos como "ok"
+    try:
+        glossario = GlossarioCompilado(ler_linhas(args.glossario))
+    except OSError as e:
+        parser.error(f"Não foi possível ler o glossário {args.glossario}: {e}")
+    if not glossario:
+        parser.error(f"O glossário {args.glossario} está vazio.")
+    os.makedirs(args.saida, exist_ok=True)
+    limiar = int(args.limiar * 100)
+
+    inicio = time.perf_counter()
+    registros = []
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futuros = {
+            executor.submit(processar_arquivo, caminho, args.saida, glossario, limiar, args.valor_recebido, args.motor): caminho
+            for caminho in arquivos
+        }
+        for futuro in as_completed(futuros):
+            registro = futuro.result()
+            registros.append(registro)
+            print(f"[{len(registros)}/{len(arquivos)}] {registro['status']:4} "
+                  f"{registro['tempos']['total']:8.2f}s  {registro['arquivo']}"
+                  + (f"  ({registro['erro']})" if registro["erro"] else ""))
+
+    registros.sort(key=lambda r: r["arquivo"])
+    manifesto = {
+        "gerado_em": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "parser_version": app4.versao_extracao(args.motor),
+        "arquivos": len(registros),
+        "erros": sum(1 for r in registros if r["status"] != "ok"),
+        "tempo_total": round(time.perf_counter() - inicio, 3),
+        "resultados": registros,
+    }
+    caminho_manifesto = os.path.join(args.saida, "manifesto.json")
+    with open(caminho_manifesto, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    print(f"Manifesto: {caminho_manifesto} ({manifesto['erros']} erro(s))")
+
+
+if __name__ == "__main__":
+    main()
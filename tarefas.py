@@ -0,0 +1,118 @@
+"""
+Fila de tarefas em segundo plano para as extrações.
+
+A extração de um PDF roda num pool de threads do servidor, fora do script
+do Streamlit: a sessão só consulta o andamento da tarefa a cada rerun. As
+tarefas são identificadas pela chave do documento (hash do conteúdo), então
+o mesmo PDF enviado de novo, ou por outra sessão, enquanto ainda está na
+fila ou em execução, reaproveita a tarefa existente. O pool limita quantas
+extrações rodam ao mesmo tempo (cada uma ainda usa os seus processos do
+Camelot), para que várias sessões não disputem todos os núcleos.
+Este módulo não importa o Streamlit.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+NA_FILA = "na fila"
+EXECUTANDO = "executando"
+CONCLUIDA = "concluída"
+FALHOU = "falhou"
+
+
+class Tarefa:
+    """
+    Andamento de uma extração: estado, páginas concluídas, linhas parciais
+    (uma lista de DataFrames, por página) e, ao final, resultado ou erro.
+    progresso e por_pagina são os callbacks passados à extração.
+    """
+
+    def __init__(self, chave, arquivo=None):
+        self.chave = chave
+        self.arquivo = arquivo
+        self.estado = NA_FILA
+        self.concluidos = 0
+        self.total = 0
+        self.parciais = []
+        self.resultado = None
+        self.erro = None
+        self._fim = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def terminada(self):
+        return self._fim.is_set()
+
+    def progresso(self, concluidos, total):
+        self.concluidos, self.total = concluidos, total
+
+    def por_pagina(self, df):
+        with self._lock:
+            self.parciais.append(df)
+
+    def linhas_parciais(self):
+        with self._lock:
+            return list(self.parciais)
+
+    def aguardar(self, timeout=None):
+        """Espera o fim da tarefa por até timeout segundos; True se terminou."""
+        return self._fim.wait(timeout)
+
+    def _executar(self, funcao, args, kwargs):
+        self.estado = EXECUTANDO
+        try:
+            self.resultado = funcao(*args, tarefa=self, **kwargs)
+            self.estado = CONCLUIDA
+        except Exception as e:
+            self.erro = f"{type(e).__name__}: {e}"
+            self.estado = FALHOU
+        finally:
+            # Terminada a tarefa, as linhas parciais não são mais necessárias
+            with self._lock:
+                self.parciais = []
+            self._fim.set()
+
+
+class FilaTarefas:
+    """
+    Pool de max_concorrentes threads com as tarefas indexadas pela chave.
+    As terminadas ficam disponíveis (até max_terminadas, das mais antigas
+    para as mais novas) para as sessões que ainda vão buscá-las; por isso o
+    resultado de uma tarefa deve ser pequeno (os dados grandes ficam num
+    cache à parte, limitado por bytes).
+    """
+
+    def __init__(self, max_concorrentes=1, max_terminadas=64):
+        self.max_concorrentes = max(1, int(max_concorrentes))
+        self.max_terminadas = max_terminadas
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concorrentes,
+                                            thread_name_prefix="extracao")
+        self._tarefas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submeter(self, chave, funcao, *args, arquivo=None, **kwargs):
+        """
+        Tarefa da chave: a existente (na fila, em execução ou terminada) ou
+        uma nova, que executa funcao(*args, tarefa=tarefa, **kwargs).
+        """
+        with self._lock:
+            tarefa = self._tarefas.get(chave)
+            if tarefa is not None:
+                return tarefa
+            tarefa = Tarefa(chave, arquivo)
+            self._tarefas[chave] = tarefa
+            self._despejar_terminadas()
+        self._executor.submit(tarefa._executar, funcao, args, kwargs)
+        return tarefa
+
+    def descartar(self, chave):
+        """Remove uma tarefa terminada (ex.: para tentar de novo uma que falhou)."""
+        with self._lock:
+            tarefa = self._tarefas.get(chave)
+            if tarefa is not None and tarefa.terminada:
+                del self._tarefas[chave]
+
+    def _despejar_terminadas(self):
+        terminadas = [c for c, t in self._tarefas.items() if t.terminada]
+        for chave in terminadas[:max(0, len(terminadas) - self.max_terminadas)]:
+            del self._tarefas[chave]